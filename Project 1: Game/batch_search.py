@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+
+import bitboard
+
+
+####################### INITIALIZATION ##################################
+'''Level-synchronous expectimax on packed boards. Instead of recursing one board at a time, every node of
+a layer is expanded at once: all spawns of all chance nodes, or all four moves of all max nodes, are made
+as array operations on a 1D array of packed boards. Identical boards in a layer are searched only once.
+The values are then reduced back up the layers with weighted sums and maxima.
+
+The depth has the same meaning as in expectimax: an even depth is a chance node, an odd depth is a max node
+and the boards below depth 0 are scored with the heuristic (a heuristics.Heuristic).'''
+NEW_TILE_EXPONENTS = np.array([1, 2], dtype=np.uint64) #Exponents of the 2 and 4 tiles
+NEW_TILE_PROBABILITIES = np.array([0.9, 0.1])
+
+CHANCE_NODE = 'chance'
+MAX_NODE = 'max'
+
+
+######################## EXPANSION ###################################
+def expand_chance(bitboards):
+    '''
+    Add a 2 or a 4 in every empty cell of every board.
+
+    Parameters:
+    - bitboards: 1D array of packed boards (dtype uint64)
+
+    Returns:
+    - children: 1D array of the spawned boards
+    - parents: 1D array with the index of the board each child was spawned from
+    - probabilities: 1D array with the probability of each child given its parent
+    - has_empty: 1D boolean array, False for the boards without an empty cell
+    '''
+    empty = bitboard.exponents_batch(bitboards) == 0
+    empty_count = empty.sum(axis=1)
+    parents, cells = np.nonzero(empty)
+    shifts = cells.astype(np.uint64) * np.uint64(bitboard.CELL_BITS)
+    # One child with a 2 and one child with a 4 for every empty cell
+    children = np.concatenate([bitboards[parents] | (exponent << shifts) for exponent in NEW_TILE_EXPONENTS])
+    probabilities = np.concatenate([probability / empty_count[parents] for probability in NEW_TILE_PROBABILITIES])
+    return children, np.tile(parents, 2), probabilities, empty_count > 0
+
+
+def expand_max(bitboards):
+    '''
+    Make the four moves on every board, keeping only the moves that change the board.
+
+    Parameters:
+    - bitboards: 1D array of packed boards (dtype uint64)
+
+    Returns:
+    - children: 1D array of the moved boards
+    - parents: 1D array with the index of the board each child was moved from
+    - moves: 1D array with the index of the move (left, up, down, right) that made each child
+    - has_move: 1D boolean array, False for the boards where no move is possible
+    '''
+    moved = np.stack([move(bitboards)[0] for move in bitboard.BATCH_MOVES], axis=1)
+    valid = moved != bitboards[:, np.newaxis]
+    parents, moves = np.nonzero(valid)
+    return moved[parents, moves], parents, moves, valid.any(axis=1)
+
+
+######################## SEARCH ###################################
+def expectimax_batch(bitboards, depth, heuristic):
+    '''
+    Evaluate many boards with expectimax, expanding one whole layer of the search tree at a time.
+
+    Parameters:
+    - bitboards: 1D array of packed boards (dtype uint64)
+    - depth: Integer, the remaining depth of the boards (same meaning as in expectimax)
+    - heuristic: heuristics.Heuristic scoring the boards below depth 0
+
+    Returns:
+    - values: 1D array with the expectimax value of every board
+    '''
+    symmetries = heuristic.symmetries()
+    layers = []
+    nodes = np.asarray(bitboards, dtype=np.uint64)
+    # Expand the tree downwards, one layer per depth
+    while depth >= 0:
+        if depth % 2 == 0:
+            children, parents, probabilities, expanded = expand_chance(nodes)
+            # Boards without an empty cell are scored with the heuristic
+            terminal_values = heuristic.evaluate_batch(nodes).astype(float)
+            layers.append((CHANCE_NODE, len(nodes), parents, probabilities, expanded, terminal_values))
+        else:
+            children, parents, moves, expanded = expand_max(nodes)
+            # Boards without a possible move are lost
+            layers.append((MAX_NODE, len(nodes), parents, moves, expanded, -math.inf))
+        # Identical boards reached through different spawns or moves are searched only once,
+        # as are boards that are images of each other under a symmetry of the heuristic
+        if len(symmetries) > 1:
+            children = bitboard.canonical_batch(children, symmetries)
+        nodes, inverse = np.unique(children, return_inverse=True)
+        layers[-1] += (inverse,)
+        depth -= 1
+    values = heuristic.evaluate_batch(nodes).astype(float)
+    # Reduce the values back up the tree
+    # Branches are the spawn probabilities of a chance layer and the move indices of a max layer
+    for kind, node_count, parents, branches, expanded, terminal_values, inverse in reversed(layers):
+        child_values = values[inverse]
+        if kind == CHANCE_NODE:
+            values = np.bincount(parents, weights=branches * child_values, minlength=node_count)
+        else:
+            move_values = np.full((node_count, len(bitboard.BATCH_MOVES)), -math.inf)
+            move_values[parents, branches] = child_values
+            values = move_values.max(axis=1)
+        values = np.where(expanded, values, terminal_values)
+    return values
+
+
+def root_values(root, depth, heuristic):
+    '''
+    Evaluate the four moves of a board the same way find_move does.
+
+    Parameters:
+    - root: Integer, the packed board (see bitboard.encode_board)
+    - depth: Integer, the depth of the search tree
+    - heuristic: heuristics.Heuristic scoring the boards below depth 0
+
+    Returns:
+    - values: 1D array with the value of each move (left, up, down, right), -inf for moves that are not possible
+    '''
+    values = np.full(len(bitboard.BATCH_MOVES), -math.inf)
+    children, _, moves, _ = expand_max(np.array([root], dtype=np.uint64))
+    if len(children):
+        values[moves] = expectimax_batch(children, depth, heuristic)
+    return values
@@ -0,0 +1,391 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import game_core
+import game_functions
+from board_engine import get_engine
+import game_2048_new2 as engine
+from game_ai import NUMBER_OF_MOVES, ai_move, ai_move_batched
+from search_stats import SearchStats
+from transposition import TranspositionTable
+
+
+####################### INITIALIZATION ##################################
+'''Benchmarks of the engine: move and heuristic throughput, expectimax search speed (positions and nodes per second),
+Monte-Carlo playouts, the packed moves of board_engine on other board sizes and the import time of the modules
+worker processes load.
+Every benchmark runs on a fixed corpus of positions taken from seeded random games, so two runs measure the same work.
+Run it as a script from this folder:
+
+    python benchmark.py --output results.json
+
+The results are written as JSON and compared with the stored baseline (BASELINE_FILE). A benchmark whose rate
+dropped by more than the tolerance is reported as a regression and the script exits with status 1.
+The speed of a shared machine changes from one second to the next, so every run is timed next to a fixed reference loop,
+and the rates are compared relative to the loop ('relative_rate', operations per reference loop).
+The import times are measured above the import of numpy: every new interpreter first imports numpy, which is only
+timed as the floor and not compared, then the module and then the reference loop. They get the wider IMPORT_TOLERANCE
+since an import reads many files and varies more than a loop of calls.
+After an intended change of speed, store the new numbers with --update-baseline.
+The script also exits with status 1 if one of the IMPORT_MODULES loads a GUI or plotting library (GUI_MODULES).'''
+BASELINE_FILE = 'benchmark_baseline.json'
+TOLERANCE = 0.25 #A rate more than 25% below the baseline is a regression, runs of the same code spread by up to 20%
+IMPORT_TOLERANCE = 0.5 #The same for the import benchmarks
+
+CORPUS_SEED = 2048
+MOVE_CORPUS_SIZE = 256 #Positions for the move and heuristic benchmarks
+SEARCH_CORPUS_SIZE = 8 #Positions for the search benchmarks
+SEARCH_DEPTHS = [1, 2, 3, 4]
+TYPE_HES = 'WEIGHT_SNAKE'
+REPEATS = 5 #Every benchmark is timed this many times, the fastest run and the median relative time are kept
+MIN_RUN_SECONDS = 0.2 #Every timed run repeats the calls until it takes at least this long, so timer noise does not count
+REFERENCE_LOOP = 100000 #Iterations of the reference loop timed next to every run, see reference_seconds
+
+#For the Monte-Carlo AI (game_ai), on the 5x5 board of game_functions
+AI_CORPUS_SIZE = 16
+AI_SEARCHES_PER_MOVE = 10
+AI_SEARCH_LENGTH = 5
+
+#Board sizes of the board_engine benchmarks
+BOARD_SIZES = [3, 4, 5, 6, 8]
+
+#Modules whose import is timed in a new interpreter, as the time above IMPORT_FLOOR that all of them pay
+IMPORT_FLOOR = 'numpy'
+IMPORT_MODULES = ['game_core', 'game_2048_new2', 'game_ai', 'self_play', 'tournament']
+IMPORT_REPEATS = 7 #Every import is timed this many times, the fastest and the median relative time are kept
+GUI_MODULES = ['tkinter', 'matplotlib'] #None of the IMPORT_MODULES may load these
+IMPORT_SCRIPT = '''import sys, time
+start = time.perf_counter()
+import {floor}
+floor_end = time.perf_counter()
+import {module}
+end = time.perf_counter()
+total = 0
+for i in range({reference_loop}):
+    total += i * i
+reference = time.perf_counter() - end
+print(floor_end - start, end - floor_end, reference, *[name for name in {gui_modules!r} if name in sys.modules])'''
+
+
+######################## CORPUS ###################################
+def build_corpus(game, count, seed=CORPUS_SEED, **options):
+    '''
+    Collect positions from random games, spread evenly over the games so early and late positions are included.
+
+    Parameters:
+    - game: Module with initialize_game, random_move and add_new_tile (game_core or game_functions)
+    - count: Integer, number of positions
+    - seed: Integer, seed of the random games
+    - options: Passed on to game.initialize_game, for example the size of game_functions
+
+    Returns:
+    - corpus: List of count 2D arrays
+    '''
+    rng = np.random.default_rng(seed)
+    positions = []
+    # Play whole games until there are at least twice as many positions as needed
+    while len(positions) < 2 * count:
+        board = game.initialize_game(rng, **options)
+        move_made = True
+        while move_made:
+            positions.append(np.copy(board))
+            board, move_made, _ = game.random_move(board, rng)
+            if move_made:
+                board = game.add_new_tile(board, rng)
+    index = np.linspace(0, len(positions) - 1, count).round().astype(int)
+    return [positions[i] for i in index]
+
+
+######################## TIMING ###################################
+def reference_seconds(iterations=REFERENCE_LOOP):
+    '''Time a fixed loop of plain Python arithmetic, the unit the speed of the machine is measured in'''
+    start = time.perf_counter()
+    total = 0
+    for i in range(iterations):
+        total += i * i
+    return time.perf_counter() - start
+
+
+def time_calls(function, arguments, repeats=REPEATS, min_run_seconds=MIN_RUN_SECONDS):
+    '''
+    Time calling function once for each argument tuple.
+    A first untimed pass over the arguments sets how many passes make up a run of at least min_run_seconds.
+    The reference loop is timed right before and after every run.
+
+    Parameters:
+    - function: The function to time
+    - arguments: List of argument tuples
+    - repeats: Integer, number of timed runs
+    - min_run_seconds: Float, the shortest time a run may take
+
+    Returns:
+    - seconds: Float, the time of one pass over the arguments in the fastest run
+    - relative_seconds: Float, the median over the runs of the time of one pass divided by the time of the reference loop
+    '''
+    start = time.perf_counter()
+    for args in arguments:
+        function(*args)
+    passes = max(1, math.ceil(min_run_seconds / max(time.perf_counter() - start, 1e-9)))
+    seconds = math.inf
+    relative = []
+    for _ in range(repeats):
+        before = reference_seconds()
+        start = time.perf_counter()
+        for _ in range(passes):
+            for args in arguments:
+                function(*args)
+        run_seconds = (time.perf_counter() - start) / passes
+        reference = (before + reference_seconds()) / 2
+        seconds = min(seconds, run_seconds)
+        relative.append(run_seconds / reference)
+    return seconds, float(np.median(relative))
+
+
+def measurement(operations, seconds, unit, relative_seconds=None):
+    '''Return the result of one benchmark as a dictionary, relative_seconds is the second result of time_calls'''
+    result = {'operations': operations, 'seconds': seconds, 'rate': operations / seconds, 'unit': unit}
+    if relative_seconds is not None:
+        result['relative_rate'] = operations / relative_seconds
+    return result
+
+
+######################## BENCHMARKS ###################################
+def bench_moves(boards):
+    '''Throughput of each move function'''
+    results = {}
+    for move in game_core.MOVES:
+        seconds, relative = time_calls(move, [(np.copy(board),) for board in boards])
+        results[move.__name__] = measurement(len(boards), seconds, 'moves/s', relative)
+    return results
+
+
+def bench_heuristic(boards):
+    '''Throughput of the heuristic, one board at a time and for the whole corpus in one batch call'''
+    seconds, relative = time_calls(engine.heuristic, [(board, TYPE_HES) for board in boards])
+    batch_seconds, batch_relative = time_calls(engine.heuristic_batch, [(np.stack(boards), TYPE_HES)])
+    return {
+        'heuristic': measurement(len(boards), seconds, 'boards/s', relative),
+        'heuristic_batch': measurement(len(boards), batch_seconds, 'boards/s', batch_relative),
+    }
+
+
+def _search(board, depth, stats=None):
+    # A new table for every position, so no run reuses the values of an earlier one
+    engine.find_move(board, depth, TYPE_HES, table=TranspositionTable(), stats=stats)
+
+
+def count_nodes(boards, depth):
+    '''Return the number of nodes find_move visits on the boards, counted in a separate untimed run'''
+    stats = SearchStats()
+    nodes = 0
+    for board in boards:
+        _search(board, depth, stats)
+        nodes += stats.total_nodes()
+    return nodes
+
+
+def bench_search(boards, depths=SEARCH_DEPTHS):
+    '''Speed of find_move with the recursive and the batched engine at every depth, and nodes per second of expectimax'''
+    results = {}
+    for depth in depths:
+        seconds, relative = time_calls(_search, [(board, depth) for board in boards])
+        results[f'find_move_depth_{depth}'] = measurement(len(boards), seconds, 'positions/s', relative)
+        results[f'expectimax_depth_{depth}'] = measurement(count_nodes(boards, depth), seconds, 'nodes/s', relative)
+        seconds, relative = time_calls(engine.find_move_batched, [(board, depth, TYPE_HES) for board in boards])
+        results[f'find_move_batched_depth_{depth}'] = measurement(len(boards), seconds, 'positions/s', relative)
+    return results
+
+
+def bench_ai_move(boards, ai_functions=(ai_move, ai_move_batched)):
+    '''Random playouts per second of the Monte-Carlo AI, one playout at a time and in lockstep'''
+    playouts = len(boards) * NUMBER_OF_MOVES * AI_SEARCHES_PER_MOVE
+    results = {}
+    for ai_function in ai_functions:
+        # Every call makes its own generator, so every pass draws the same random numbers
+        def playout(board, ai_function=ai_function):
+            ai_function(board, AI_SEARCHES_PER_MOVE, AI_SEARCH_LENGTH, np.random.default_rng(CORPUS_SEED))
+        seconds, relative = time_calls(playout, [(board,) for board in boards])
+        results[ai_function.__name__] = measurement(playouts, seconds, 'playouts/s', relative)
+    return results
+
+
+def bench_board_sizes(sizes=BOARD_SIZES):
+    '''Throughput of the packed moves and playouts per second of the Monte-Carlo AI for every board size'''
+    results = {}
+    for size in sizes:
+        size_engine = get_engine(size)
+        boards = build_corpus(game_core, MOVE_CORPUS_SIZE, size=size)
+        # Every position is moved in all four directions
+        arguments = [(move, size_engine.encode(board)) for board in boards for move in size_engine.moves]
+        seconds, relative = time_calls(lambda move, packed: move(packed), arguments)
+        results[f'engine_moves_{size}x{size}'] = measurement(len(arguments), seconds, 'moves/s', relative)
+        ai_results = bench_ai_move(boards[:AI_CORPUS_SIZE], [ai_move_batched])
+        results[f'ai_move_batched_{size}x{size}'] = ai_results['ai_move_batched']
+    return results
+
+
+def time_import(module, floor=IMPORT_FLOOR):
+    '''
+    Import floor and then a module in a new Python interpreter, the way a worker process starts.
+
+    Parameters:
+    - module: String, name of a module in this folder
+    - floor: String, name of the module imported first
+
+    Returns:
+    - floor_seconds: Float, the time the import of floor took
+    - seconds: Float, the time the import of module took after floor was loaded
+    - reference: Float, the time of the reference loop in the same interpreter
+    - gui_modules: List of the GUI_MODULES that were loaded by the import
+    '''
+    script = IMPORT_SCRIPT.format(floor=floor, module=module, reference_loop=REFERENCE_LOOP, gui_modules=GUI_MODULES)
+    output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), float(output[1]), float(output[2]), output[3:]
+
+
+def bench_imports(modules=IMPORT_MODULES, repeats=IMPORT_REPEATS, floor=IMPORT_FLOOR):
+    '''
+    Imports per second of every module in a new interpreter, counting only the time above the import of floor,
+    with the GUI modules each one loaded. The floor itself is reported with 'floor' set, compare leaves it out.
+    '''
+    results = {}
+    floor_seconds = math.inf
+    for module in modules:
+        runs = [time_import(module, floor) for _ in range(repeats)]
+        floor_seconds = min(floor_seconds, *[run[0] for run in runs])
+        # Never below a millisecond, so a module that is already loaded with floor does not give an endless rate
+        seconds = max(min(run[1] for run in runs), 1e-3)
+        relative = max(float(np.median([run[1] / run[2] for run in runs])), 1e-3)
+        results[f'import_{module}'] = measurement(1, seconds, 'imports/s above ' + floor, relative)
+        results[f'import_{module}']['gui_modules'] = runs[0][3]
+    results[f'import_{floor}'] = measurement(1, floor_seconds, 'imports/s')
+    results[f'import_{floor}']['floor'] = True
+    return results
+
+
+def run_benchmarks(depths=SEARCH_DEPTHS, sizes=BOARD_SIZES):
+    '''
+    Run all benchmarks.
+
+    Parameters:
+    - depths: List of search depths for the find_move benchmarks
+    - sizes: List of board sizes for the board_engine benchmarks
+
+    Returns:
+    - report: Dictionary with the machine ('environment') and one entry per benchmark ('benchmarks')
+    '''
+    boards = build_corpus(game_core, MOVE_CORPUS_SIZE)
+    search_boards = build_corpus(game_core, SEARCH_CORPUS_SIZE)
+    ai_boards = build_corpus(game_functions, AI_CORPUS_SIZE)
+    benchmarks = {}
+    benchmarks.update(bench_moves(boards))
+    benchmarks.update(bench_heuristic(boards))
+    benchmarks.update(bench_search(search_boards, depths))
+    benchmarks.update(bench_ai_move(ai_boards))
+    benchmarks.update(bench_board_sizes(sizes))
+    benchmarks.update(bench_imports())
+    environment = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'corpus_seed': CORPUS_SEED,
+        'repeats': REPEATS,
+        'min_run_seconds': MIN_RUN_SECONDS,
+    }
+    return {'environment': environment, 'benchmarks': benchmarks}
+
+
+######################## BASELINE ###################################
+def compare(report, baseline, tolerance=TOLERANCE, import_tolerance=IMPORT_TOLERANCE):
+    '''
+    Compare the rates of a report with a baseline report. The import floor (see bench_imports) is left out.
+
+    Parameters:
+    - report: Dictionary returned by run_benchmarks
+    - baseline: Dictionary returned by run_benchmarks on an earlier version
+    - tolerance: Float, the fraction a rate may drop before it counts as a regression
+    - import_tolerance: Float, the same for the import benchmarks
+
+    Returns:
+    - rows: List of (name, baseline rate, rate, ratio, status) for the benchmarks in both reports, with the rates
+      relative to the reference loop where both reports have them,
+      status is 'regression', 'faster' or 'ok'
+    '''
+    rows = []
+    for name, result in report['benchmarks'].items():
+        if name not in baseline['benchmarks'] or result.get('floor'):
+            continue
+        # The rates relative to the reference loop, when both reports have them
+        key = 'relative_rate' if 'relative_rate' in result and 'relative_rate' in baseline['benchmarks'][name] else 'rate'
+        baseline_rate = baseline['benchmarks'][name][key]
+        ratio = result[key] / baseline_rate
+        allowed = import_tolerance if name.startswith('import_') else tolerance
+        if ratio < 1 - allowed:
+            status = 'regression'
+        elif ratio > 1 + allowed:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, baseline_rate, result[key], ratio, status))
+    return rows
+
+
+def print_comparison(rows, file=sys.stderr):
+    '''Print the rows of compare as a table'''
+    print(f"{'benchmark':<28}{'baseline':>14}{'current':>14}{'ratio':>8}  status", file=file)
+    for name, baseline_rate, rate, ratio, status in rows:
+        print(f'{name:<28}{baseline_rate:>14.1f}{rate:>14.1f}{ratio:>8.2f}  {status}', file=file)
+
+
+def write_json(data, path):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the 2048 engine and compare with the stored baseline.')
+    parser.add_argument('--output', default=None, help='JSON file for the results, standard output if not given')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON file with the baseline results')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed fraction a rate may drop')
+    parser.add_argument('--import-tolerance', type=float, default=IMPORT_TOLERANCE,
+                        help='allowed fraction an import rate may drop')
+    parser.add_argument('--depths', type=int, nargs='+', default=SEARCH_DEPTHS, help='search depths of the find_move benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=BOARD_SIZES, help='board sizes of the board_engine benchmarks')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.depths, args.sizes)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        write_json(report, args.output)
+    gui_imports = {name: result['gui_modules'] for name, result in report['benchmarks'].items() if result.get('gui_modules')}
+    for name, gui_modules in gui_imports.items():
+        print(f"{name} loads {', '.join(gui_modules)}, it must stay importable without them", file=sys.stderr)
+    if gui_imports:
+        return 1
+    if args.update_baseline:
+        write_json(report, args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline found at {args.baseline}, run with --update-baseline to store one', file=sys.stderr)
+        return 0
+    with open(args.baseline) as baseline_file:
+        rows = compare(report, json.load(baseline_file), args.tolerance, args.import_tolerance)
+    print_comparison(rows)
+    return 1 if any(status == 'regression' for *_, status in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,531 @@
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+
+####################### INITIALIZATION ##################################
+'''The board is packed into a single 64-bit integer. Every cell is a nibble holding log2 of the tile
+value (0 for an empty cell), cell (row, col) is stored at bit offset 4 * (4 * row + col).
+So row 0 is the lowest 16 bits of the integer and column 0 is the lowest nibble of every row.'''
+CELL_COUNT = 4
+NUMBER_OF_SQUARES = CELL_COUNT * CELL_COUNT
+CELL_BITS = 4
+ROW_BITS = CELL_BITS * CELL_COUNT
+CELL_MASK = 0xF
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = CELL_MASK #The largest tile that fits in a nibble is 2**15
+
+CELL_SHIFTS = np.arange(0, 64, CELL_BITS, dtype=np.uint64)
+
+#For the row tables
+ROW_COUNT = 1 << ROW_BITS #Every possible encoded row
+ROW_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'row_tables.npz')
+ROW_TABLE_NAMES = ('left', 'right', 'left_score', 'right_score', 'left_moved', 'right_moved')
+
+
+######################## PACKING ###################################
+def encode_board(board):
+    '''
+    Pack a game board into a 64-bit integer.
+
+    Parameters:
+    - board: 2D array (4x4) with the tile values of the game
+
+    Returns:
+    - bitboard: Integer with the log2 value of each tile in its own nibble
+
+    Raises:
+    - ValueError: If a tile is larger than 2**MAX_EXPONENT, it would not fit in its nibble
+    '''
+    bitboard = 0
+    for shift, value in zip(range(0, 64, CELL_BITS), board.flat):
+        if value:
+            # The exponent of a power of two is one less than its bit length
+            exponent = int(value).bit_length() - 1
+            if exponent > MAX_EXPONENT:
+                raise ValueError(f'Tile {value} is larger than the largest packed tile {1 << MAX_EXPONENT}')
+            bitboard |= exponent << shift
+    return bitboard
+
+
+def decode_board(bitboard):
+    '''
+    Unpack a 64-bit integer into a game board.
+
+    Parameters:
+    - bitboard: Integer holding the packed board
+
+    Returns:
+    - board: 2D array (4x4) of tile values with the same dtype as initialize_game
+    '''
+    exponents = (np.uint64(bitboard) >> CELL_SHIFTS) & np.uint64(CELL_MASK)
+    exponents = exponents.astype("int")
+    board = np.where(exponents > 0, 1 << exponents, 0)
+    return board.reshape((CELL_COUNT, CELL_COUNT))
+
+
+def transpose(bitboard):
+    '''
+    Swap rows and columns of a packed board, so column moves can reuse the row lookups.
+    The nibbles are moved in two steps: first the 4 bit blocks inside every 2x2 square,
+    then the 2x2 squares themselves.
+    '''
+    a1 = bitboard & 0xF0F00F0FF0F00F0F
+    a2 = bitboard & 0x0000F0F00000F0F0
+    a3 = bitboard & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+######################## ROW MOVES ###################################
+def slide_row_right(cells):
+    '''
+    Move a single row to the right: push the tiles to the right, merge equal neighbours
+    starting from the right edge and push the tiles again.
+
+    Parameters:
+    - cells: List with the exponents of the row (4 on this board), index 0 is the leftmost cell
+
+    Returns:
+    - new_cells: List with the exponents of the row after the move
+    - score: Sum of the tile values created by merges
+    '''
+    # Push the tiles to the right
+    tiles = [cell for cell in cells if cell != 0]
+    merged = []
+    score = 0
+    # Merge equal neighbours, starting from the right edge
+    while tiles:
+        cell = tiles.pop()
+        # Two 2**15 tiles are not merged since the result would not fit in a nibble
+        if tiles and tiles[-1] == cell and cell < MAX_EXPONENT:
+            tiles.pop()
+            cell += 1
+            score += 1 << cell
+        merged.append(cell)
+    # Push the tiles to the right again after merging
+    new_cells = [0] * (len(cells) - len(merged)) + merged[::-1]
+    return new_cells, score
+
+
+def pack_row(cells):
+    '''Pack a list of 4 exponents into a 16 bit row, index 0 is the lowest nibble'''
+    row = 0
+    for col, cell in enumerate(cells):
+        row |= cell << (CELL_BITS * col)
+    return row
+
+
+def unpack_row(row):
+    '''Unpack a 16 bit row into a list of 4 exponents'''
+    return [(row >> (CELL_BITS * col)) & CELL_MASK for col in range(CELL_COUNT)]
+
+
+def reverse_row(row):
+    '''Mirror a 16 bit row, so a move to the left can be made as a move to the right'''
+    return ((row & 0x000F) << 12) | ((row & 0x00F0) << 4) | ((row & 0x0F00) >> 4) | ((row & 0xF000) >> 12)
+
+
+def build_row_tables():
+    '''
+    Move every one of the 65536 possible rows to the left and to the right.
+
+    Returns:
+    - tables: Dictionary of arrays indexed by the encoded row, with the moved rows ('left', 'right'),
+      the merge scores ('left_score', 'right_score') and a flag telling if the row changed ('left_moved', 'right_moved')
+    '''
+    rows = np.arange(ROW_COUNT)
+    right = np.zeros(ROW_COUNT, dtype=np.uint16)
+    right_score = np.zeros(ROW_COUNT, dtype=np.uint32)
+    for row in range(ROW_COUNT):
+        new_cells, score = slide_row_right(unpack_row(row))
+        right[row] = pack_row(new_cells)
+        right_score[row] = score
+    # A move to the left is a move to the right of the mirrored row
+    mirrored = np.array([reverse_row(row) for row in range(ROW_COUNT)], dtype=np.uint16)
+    left = mirrored[right[mirrored]]
+    left_score = right_score[mirrored]
+    return {
+        'left': left,
+        'right': right,
+        'left_score': left_score,
+        'right_score': right_score,
+        'left_moved': left != rows,
+        'right_moved': right != rows,
+    }
+
+
+def load_row_tables(path=ROW_TABLE_FILE):
+    '''
+    Load the row tables from the cache file, or build them and write the cache file if it is missing or broken.
+
+    Parameters:
+    - path: String, location of the cache file
+
+    Returns:
+    - tables: Dictionary of arrays, see build_row_tables
+    '''
+    try:
+        with np.load(path) as cached:
+            tables = {name: cached[name] for name in ROW_TABLE_NAMES}
+        if all(table.shape == (ROW_COUNT,) for table in tables.values()):
+            return tables
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
+    tables = build_row_tables()
+    write_table_cache(path, tables)
+    return tables
+
+
+def write_table_cache(path, arrays):
+    '''
+    Write a dictionary of arrays to a cache file, ignoring the error if the directory is not writable.
+    Every process writes to its own temporary file first and then replaces the cache file in one step,
+    so a half written file is never loaded, even when several processes build the cache at the same time.
+
+    Parameters:
+    - path: String, location of the cache file
+    - arrays: Dictionary from name to array, as taken by np.savez
+    '''
+    try:
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+    except OSError:
+        return
+    try:
+        with os.fdopen(descriptor, 'wb') as cache_file:
+            np.savez(cache_file, **arrays)
+        # mkstemp makes the file readable by its owner only, the cache is for everyone
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except OSError:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+ROW_TABLES = load_row_tables()
+ROW_LEFT = ROW_TABLES['left']
+ROW_RIGHT = ROW_TABLES['right']
+ROW_LEFT_SCORE = ROW_TABLES['left_score']
+ROW_RIGHT_SCORE = ROW_TABLES['right_score']
+ROW_LEFT_MOVED = ROW_TABLES['left_moved']
+ROW_RIGHT_MOVED = ROW_TABLES['right_moved']
+
+# Plain lists are much faster than arrays to index with a single Python integer
+_ROW_LEFT = ROW_LEFT.tolist()
+_ROW_RIGHT = ROW_RIGHT.tolist()
+_ROW_LEFT_SCORE = ROW_LEFT_SCORE.tolist()
+_ROW_RIGHT_SCORE = ROW_RIGHT_SCORE.tolist()
+
+
+def row_right(row):
+    '''Look up the row after a move to the right together with the merge score'''
+    return _ROW_RIGHT[row], _ROW_RIGHT_SCORE[row]
+
+
+def row_left(row):
+    '''Look up the row after a move to the left together with the merge score'''
+    return _ROW_LEFT[row], _ROW_LEFT_SCORE[row]
+
+
+######################## BOARD MOVES ###################################
+'''All moves take a packed board and return the packed board after the move together with the score.
+The move is valid if the returned board differs from the given one.
+Up and down are made on the transposed board, where a column of the game is stored as a row.'''
+def _move_rows(bitboard, rows, scores):
+    # Four table lookups, one for each row
+    row_0 = bitboard & ROW_MASK
+    row_1 = (bitboard >> 16) & ROW_MASK
+    row_2 = (bitboard >> 32) & ROW_MASK
+    row_3 = bitboard >> 48
+    new_board = rows[row_0] | (rows[row_1] << 16) | (rows[row_2] << 32) | (rows[row_3] << 48)
+    score = scores[row_0] + scores[row_1] + scores[row_2] + scores[row_3]
+    return new_board, score
+
+
+def move_left(bitboard):
+    return _move_rows(bitboard, _ROW_LEFT, _ROW_LEFT_SCORE)
+
+
+def move_right(bitboard):
+    return _move_rows(bitboard, _ROW_RIGHT, _ROW_RIGHT_SCORE)
+
+
+def move_up(bitboard):
+    new_board, score = _move_rows(transpose(bitboard), _ROW_LEFT, _ROW_LEFT_SCORE)
+    return transpose(new_board), score
+
+
+def move_down(bitboard):
+    new_board, score = _move_rows(transpose(bitboard), _ROW_RIGHT, _ROW_RIGHT_SCORE)
+    return transpose(new_board), score
+
+
+def apply_move(board, move):
+    '''
+    Make a move on a game board through the packed representation.
+
+    Parameters:
+    - board: 2D array (4x4) representing the game board
+    - move: Function, one of the packed moves (e.g., bitboard.move_left)
+
+    Returns:
+    - board: The updated board as a new array
+    - move_made: Flag indicating if any tile was pushed or merged
+    - score: The score obtained from merging
+    '''
+    bitboard = encode_board(board)
+    new_bitboard, score = move(bitboard)
+    return decode_board(new_bitboard), new_bitboard != bitboard, score
+
+
+######################## LEGALITY ###################################
+'''Whether a move is possible can be read from the moved tables without making the move,
+and whether any move is possible from the nibbles themselves: the game goes on while a cell is empty
+or two neighbouring cells hold the same tile.'''
+_ROW_LEFT_MOVED = ROW_LEFT_MOVED.tolist()
+_ROW_RIGHT_MOVED = ROW_RIGHT_MOVED.tolist()
+
+#Lowest bit of the nibbles checked for a zero or for a 2**15 tile
+NIBBLE_LOW_BITS = 0x1111111111111111 #Every cell
+HORIZONTAL_PAIR_BITS = 0x0111011101110111 #Every cell but the last of its row, compared with its right neighbour
+VERTICAL_PAIR_BITS = 0x0000111111111111 #Every cell but the last row, compared with the cell below
+
+
+def _rows_moved(bitboard, moved):
+    return (moved[bitboard & ROW_MASK] or moved[(bitboard >> 16) & ROW_MASK]
+            or moved[(bitboard >> 32) & ROW_MASK] or moved[bitboard >> 48])
+
+
+def legal_directions(bitboard):
+    '''
+    Find the moves that change a packed board, without making them.
+
+    Parameters:
+    - bitboard: Integer, the packed board
+
+    Returns:
+    - directions: Tuple of four flags, True for the possible moves in the order left, up, down, right
+    '''
+    transposed = transpose(bitboard)
+    return (_rows_moved(bitboard, _ROW_LEFT_MOVED), _rows_moved(transposed, _ROW_LEFT_MOVED),
+            _rows_moved(transposed, _ROW_RIGHT_MOVED), _rows_moved(bitboard, _ROW_RIGHT_MOVED))
+
+
+def _zero_nibbles(bitboard, low_bits):
+    # Fold every nibble onto its lowest bit, a zero nibble leaves that bit unset
+    folded = bitboard | (bitboard >> 1) | (bitboard >> 2) | (bitboard >> 3)
+    return ~folded & low_bits
+
+
+def _full_nibbles(bitboard, low_bits):
+    # Only a nibble holding 2**15 keeps its lowest bit set when all four bits are combined
+    return bitboard & (bitboard >> 1) & (bitboard >> 2) & (bitboard >> 3) & low_bits
+
+
+def can_move(bitboard):
+    '''
+    Check if any move is possible, with a few bit operations instead of trial moves.
+
+    Parameters:
+    - bitboard: Integer, the packed board
+
+    Returns:
+    - move_possible: True if a cell is empty or two neighbouring cells hold the same tile.
+      Two neighbouring 2**15 tiles do not count, the packed moves cannot merge them
+    '''
+    if _zero_nibbles(bitboard, NIBBLE_LOW_BITS):
+        return True
+    # A pair starting on a 2**15 tile is left out
+    mergeable = ~_full_nibbles(bitboard, NIBBLE_LOW_BITS)
+    return bool((_zero_nibbles(bitboard ^ (bitboard >> CELL_BITS), HORIZONTAL_PAIR_BITS)
+                 | _zero_nibbles(bitboard ^ (bitboard >> ROW_BITS), VERTICAL_PAIR_BITS)) & mergeable)
+
+
+######################## SYMMETRIES ###################################
+'''The 8 rotations and reflections of the board. The game rules do not change under any of them, so a position
+and its image have the same expectimax value whenever the heuristic weights do not change under the symmetry either
+(see invariant_symmetries). The best move of the image is the image of the best move, given by SYMMETRY_MOVES.
+The symmetries work on a single packed board as well as on an array of packed boards (dtype uint64).'''
+def mirror(bitboard):
+    '''Reverse the cells of every row, so left and right swap'''
+    # First swap neighbouring nibbles, then neighbouring bytes
+    swapped = ((bitboard & 0xF0F0F0F0F0F0F0F0) >> 4) | ((bitboard & 0x0F0F0F0F0F0F0F0F) << 4)
+    return ((swapped & 0xFF00FF00FF00FF00) >> 8) | ((swapped & 0x00FF00FF00FF00FF) << 8)
+
+
+def flip(bitboard):
+    '''Reverse the order of the rows, so up and down swap'''
+    swapped = ((bitboard & 0xFFFF0000FFFF0000) >> 16) | ((bitboard & 0x0000FFFF0000FFFF) << 16)
+    return ((swapped & 0xFFFFFFFF00000000) >> 32) | ((swapped & 0x00000000FFFFFFFF) << 32)
+
+
+def _identity(bitboard):
+    return bitboard
+
+
+def _rotate_180(bitboard):
+    return mirror(flip(bitboard))
+
+
+def _anti_transpose(bitboard):
+    return transpose(mirror(flip(bitboard)))
+
+
+def _rotate_left(bitboard):
+    return transpose(mirror(bitboard))
+
+
+def _rotate_right(bitboard):
+    return transpose(flip(bitboard))
+
+
+IDENTITY = 0
+SYMMETRY_NAMES = ['identity', 'mirror', 'flip', 'rotate_180', 'transpose', 'anti_transpose', 'rotate_left', 'rotate_right']
+SYMMETRIES = [_identity, mirror, flip, _rotate_180, transpose, _anti_transpose, _rotate_left, _rotate_right]
+# The same symmetries on a 2D array, for example a weight matrix
+ARRAY_SYMMETRIES = [
+    lambda array: array,
+    lambda array: array[:, ::-1],
+    lambda array: array[::-1],
+    lambda array: array[::-1, ::-1],
+    lambda array: array.T,
+    lambda array: array[::-1, ::-1].T,
+    lambda array: array[:, ::-1].T,
+    lambda array: array[::-1].T,
+]
+# Index of the image of each move (left, up, down, right) under each symmetry
+SYMMETRY_MOVES = [
+    (0, 1, 2, 3),
+    (3, 1, 2, 0),
+    (0, 2, 1, 3),
+    (3, 2, 1, 0),
+    (1, 0, 3, 2),
+    (2, 3, 0, 1),
+    (2, 0, 3, 1),
+    (1, 3, 0, 2),
+]
+
+
+def invariant_symmetries(weight):
+    '''
+    Find the symmetries that leave a weight matrix unchanged, under which the heuristic gives the same value.
+
+    Parameters:
+    - weight: 2D array (4x4), the weight matrix of the heuristic
+
+    Returns:
+    - symmetries: Tuple of indices into SYMMETRIES, always starting with IDENTITY
+    '''
+    return tuple(index for index, symmetry in enumerate(ARRAY_SYMMETRIES) if np.array_equal(symmetry(weight), weight))
+
+
+def canonical_form(bitboard, symmetries):
+    '''
+    Choose one representative of a board among its images, the smallest packed integer.
+
+    Parameters:
+    - bitboard: Integer, the packed board
+    - symmetries: Tuple of indices into SYMMETRIES to consider
+
+    Returns:
+    - key: Integer, the smallest image of the board
+    - symmetry: Integer, index of the symmetry that maps the board to key
+    '''
+    key = bitboard
+    symmetry = IDENTITY
+    for index in symmetries:
+        if index != IDENTITY:
+            image = SYMMETRIES[index](bitboard)
+            if image < key:
+                key = image
+                symmetry = index
+    return key, symmetry
+
+
+def canonical_batch(bitboards, symmetries):
+    '''Return the smallest image of every board of a 1D array of packed boards (dtype uint64)'''
+    return np.minimum.reduce([SYMMETRIES[index](bitboards) for index in symmetries])
+
+
+######################## BATCH MOVES ###################################
+'''The batch moves below do the same as the moves above on a 1D array of packed boards (dtype uint64),
+so a whole layer of a search or thousands of playouts can be moved with a few array operations.
+The order of BATCH_MOVES is the move order of the game: left, up, down and right.'''
+_ROW_LEFT_64 = ROW_LEFT.astype(np.uint64)
+_ROW_RIGHT_64 = ROW_RIGHT.astype(np.uint64)
+_ROW_LEFT_SCORE_64 = ROW_LEFT_SCORE.astype(np.int64)
+_ROW_RIGHT_SCORE_64 = ROW_RIGHT_SCORE.astype(np.int64)
+
+
+def _move_rows_batch(bitboards, rows, scores):
+    row_0 = bitboards & ROW_MASK
+    row_1 = (bitboards >> 16) & ROW_MASK
+    row_2 = (bitboards >> 32) & ROW_MASK
+    row_3 = bitboards >> 48
+    new_boards = rows[row_0] | (rows[row_1] << 16) | (rows[row_2] << 32) | (rows[row_3] << 48)
+    score = scores[row_0] + scores[row_1] + scores[row_2] + scores[row_3]
+    return new_boards, score
+
+
+def move_left_batch(bitboards):
+    return _move_rows_batch(bitboards, _ROW_LEFT_64, _ROW_LEFT_SCORE_64)
+
+
+def move_right_batch(bitboards):
+    return _move_rows_batch(bitboards, _ROW_RIGHT_64, _ROW_RIGHT_SCORE_64)
+
+
+def move_up_batch(bitboards):
+    new_boards, score = _move_rows_batch(transpose(bitboards), _ROW_LEFT_64, _ROW_LEFT_SCORE_64)
+    return transpose(new_boards), score
+
+
+def move_down_batch(bitboards):
+    new_boards, score = _move_rows_batch(transpose(bitboards), _ROW_RIGHT_64, _ROW_RIGHT_SCORE_64)
+    return transpose(new_boards), score
+
+
+BATCH_MOVES = [move_left_batch, move_up_batch, move_down_batch, move_right_batch]
+
+
+def exponents_batch(bitboards):
+    '''
+    Unpack an array of packed boards into the exponent of every cell.
+
+    Parameters:
+    - bitboards: 1D array of packed boards (dtype uint64)
+
+    Returns:
+    - exponents: 2D array (N x 16, dtype uint8), column 4 * row + col holds the exponent of that cell
+    '''
+    return ((bitboards[:, np.newaxis] >> CELL_SHIFTS) & np.uint64(CELL_MASK)).astype(np.uint8)
+
+
+def encode_batch(boards):
+    '''
+    Pack a stack of game boards, like encode_board does for one board.
+
+    Parameters:
+    - boards: 3D array (N x 4 x 4) of game boards
+
+    Returns:
+    - bitboards: 1D array of packed boards (dtype uint64)
+
+    Raises:
+    - ValueError: If a tile is larger than 2**MAX_EXPONENT
+    '''
+    flat = boards.reshape((len(boards), NUMBER_OF_SQUARES))
+    exponents = np.zeros(flat.shape, dtype=np.uint64)
+    tiles = flat > 0
+    # The tiles are powers of two, so log2 is exact
+    exponents[tiles] = np.log2(flat[tiles]).astype(np.uint64)
+    if np.any(exponents > MAX_EXPONENT):
+        raise ValueError(f'A tile is larger than the largest packed tile {1 << MAX_EXPONENT}')
+    return np.bitwise_or.reduce(exponents << CELL_SHIFTS, axis=1)
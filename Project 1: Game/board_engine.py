@@ -0,0 +1,256 @@
+from array import array
+
+import numpy as np
+
+import bitboard
+
+
+####################### INITIALIZATION ##################################
+'''The packed board of bitboard.py for every board size from MIN_SIZE to MAX_SIZE.
+A board of size n is packed into one Python integer with a nibble per cell holding log2 of the tile value,
+cell (row, col) is stored at bit offset 4 * (n * row + col). Row 0 is the lowest 4 * n bits and
+column 0 is the lowest nibble of every row, so the 4x4 layout is the one of bitboard.py.
+
+A row is moved with a table holding every one of the 16**n encoded rows, built for each size the first time
+the size is used. A table for more than MAX_TABLE_ROWS rows would not fit in memory, so for those sizes
+(6x6 and larger) a row is moved the first time it is seen and the result is kept instead: a game only ever
+meets a tiny part of the possible rows.
+
+Get the engine of a size with get_engine. As in bitboard.py two 2**15 tiles are not merged.'''
+MIN_SIZE = 3
+MAX_SIZE = 8
+MAX_TABLE_ROWS = 1 << 20 #Largest row table that is built, 16**5 rows
+MAX_MEMO_ROWS = 1 << 18 #The kept rows of the larger sizes are dropped when there are more than this
+
+CELL_BITS = bitboard.CELL_BITS
+CELL_MASK = bitboard.CELL_MASK
+MAX_EXPONENT = bitboard.MAX_EXPONENT
+
+_ENGINES = {}
+
+
+######################## ROW TABLES ###################################
+def build_row_tables(size):
+    '''
+    Move every possible row of a board size to the left and to the right, with array operations over all rows at once.
+
+    Parameters:
+    - size: Integer, number of cells in a row
+
+    Returns:
+    - tables: Dictionary of arrays indexed by the encoded row, with the moved rows ('left', 'right')
+      and the merge scores ('left_score', 'right_score')
+    '''
+    rows = np.arange(1 << (CELL_BITS * size), dtype=np.int64)
+    shifts = CELL_BITS * np.arange(size)
+    cells = (rows[:, np.newaxis] >> shifts) & CELL_MASK
+    right_cells = _push_right(cells)
+    score = np.zeros(len(rows), dtype=np.int64)
+    # Merge equal neighbours, starting from the right edge, like slide_row_right
+    for col in range(size - 1, 0, -1):
+        tile = right_cells[:, col]
+        merge = (tile == right_cells[:, col - 1]) & (tile != 0) & (tile < MAX_EXPONENT)
+        tile[merge] += 1
+        score[merge] += 1 << tile[merge]
+        right_cells[merge, col - 1] = 0
+    right = np.sum(_push_right(right_cells) << shifts, axis=1)
+    # A move to the left is a move to the right of the mirrored row
+    mirrored = np.sum(cells[:, ::-1] << shifts, axis=1)
+    return {
+        'left': mirrored[right[mirrored]].astype(np.uint32),
+        'right': right.astype(np.uint32),
+        'left_score': score[mirrored].astype(np.uint32),
+        'right_score': score.astype(np.uint32),
+    }
+
+
+def _push_right(cells):
+    # Move the tiles of every row to the right, keeping their order
+    order = np.argsort(cells != 0, axis=1, kind='stable')
+    return np.take_along_axis(cells, order, axis=1)
+
+
+class _RowTable:
+    def __init__(self, rows, scores):
+        # Arrays of the array module give back Python integers, fast and with 4 bytes per entry
+        self.rows = array('I', rows.astype(np.uint32).tobytes())
+        self.scores = array('I', scores.astype(np.uint32).tobytes())
+
+    def __getitem__(self, row):
+        return self.rows[row], self.scores[row]
+
+
+class _RowMemo(dict):
+    def __init__(self, size, left):
+        '''The moved rows of a size without a table, every row is moved with slide_row_right the first time it is looked up'''
+        super().__init__()
+        self.size = size
+        self.left = left
+
+    def __missing__(self, row):
+        if len(self) >= MAX_MEMO_ROWS:
+            self.clear()
+        cells = [(row >> (CELL_BITS * col)) & CELL_MASK for col in range(self.size)]
+        if self.left:
+            new_cells, score = bitboard.slide_row_right(cells[::-1])
+            new_cells = new_cells[::-1]
+        else:
+            new_cells, score = bitboard.slide_row_right(cells)
+        new_row = 0
+        for col, cell in enumerate(new_cells):
+            new_row |= cell << (CELL_BITS * col)
+        self[row] = new_row, score
+        return new_row, score
+
+
+######################## ENGINE ###################################
+class BoardEngine:
+    def __init__(self, size):
+        '''
+        Packed moves for boards of one size, use get_engine to share the engine of a size.
+
+        Parameters:
+        - size: Integer, number of cells on a side, from MIN_SIZE to MAX_SIZE
+
+        Attributes:
+        - uses_tables: True if the rows are moved with full row tables, False if they are moved and kept on demand
+        - moves: The move methods in the order left, up, down, right (the order of bitboard.legal_directions)
+        '''
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f'Board size must be between {MIN_SIZE} and {MAX_SIZE}, got {size}')
+        self.size = size
+        self.row_bits = CELL_BITS * size
+        self.row_mask = (1 << self.row_bits) - 1
+        self.row_shifts = range(0, size * self.row_bits, self.row_bits)
+        self.uses_tables = 1 << self.row_bits <= MAX_TABLE_ROWS
+        if size == bitboard.CELL_COUNT:
+            # The 4x4 tables are already loaded by bitboard.py
+            tables = bitboard.ROW_TABLES
+        elif self.uses_tables:
+            tables = build_row_tables(size)
+        if self.uses_tables:
+            self.left_rows = _RowTable(tables['left'], tables['left_score'])
+            self.right_rows = _RowTable(tables['right'], tables['right_score'])
+        else:
+            self.left_rows = _RowMemo(size, left=True)
+            self.right_rows = _RowMemo(size, left=False)
+        # Lowest bit of the nibbles checked for a zero or a 2**15 tile by can_move
+        self.cell_bits = sum(1 << (CELL_BITS * cell) for cell in range(size * size))
+        self.horizontal_pair_bits = sum(1 << (CELL_BITS * (size * row + col)) for row in range(size) for col in range(size - 1))
+        self.vertical_pair_bits = sum(1 << (CELL_BITS * cell) for cell in range(size * (size - 1)))
+        if size == bitboard.CELL_COUNT:
+            # The unrolled functions of bitboard.py are faster than the loops over rows and cells
+            self.encode, self.decode, self.transpose = bitboard.encode_board, bitboard.decode_board, bitboard.transpose
+            self.move_left, self.move_up = bitboard.move_left, bitboard.move_up
+            self.move_down, self.move_right = bitboard.move_down, bitboard.move_right
+            self.legal_directions, self.can_move = bitboard.legal_directions, bitboard.can_move
+        self.moves = [self.move_left, self.move_up, self.move_down, self.move_right]
+
+    def encode(self, board):
+        '''Pack a game board (2D array, size x size) into an integer, see bitboard.encode_board, which also raises the ValueError'''
+        packed = 0
+        for shift, value in zip(range(0, CELL_BITS * self.size * self.size, CELL_BITS), board.flat):
+            if value:
+                exponent = int(value).bit_length() - 1
+                if exponent > MAX_EXPONENT:
+                    raise ValueError(f'Tile {value} is larger than the largest packed tile {1 << MAX_EXPONENT}')
+                packed |= exponent << shift
+        return packed
+
+    def decode(self, packed):
+        '''Unpack an integer into a game board (2D array, size x size)'''
+        exponents = np.array([(packed >> shift) & CELL_MASK for shift in range(0, CELL_BITS * self.size * self.size, CELL_BITS)])
+        board = np.where(exponents > 0, 1 << exponents, 0)
+        return board.reshape((self.size, self.size))
+
+    def transpose(self, packed):
+        '''Swap rows and columns of a packed board'''
+        size = self.size
+        transposed = 0
+        for row in range(size):
+            row_cells = packed >> (CELL_BITS * size * row)
+            for col in range(size):
+                transposed |= ((row_cells >> (CELL_BITS * col)) & CELL_MASK) << (CELL_BITS * (size * col + row))
+        return transposed
+
+    ######################## MOVES ###################################
+    def _move_rows(self, packed, lookup):
+        new_board = 0
+        score = 0
+        for shift in self.row_shifts:
+            new_row, row_score = lookup[(packed >> shift) & self.row_mask]
+            new_board |= new_row << shift
+            score += row_score
+        return new_board, score
+
+    def move_left(self, packed):
+        '''Return the packed board after the move together with the score, as bitboard.move_left'''
+        return self._move_rows(packed, self.left_rows)
+
+    def move_right(self, packed):
+        return self._move_rows(packed, self.right_rows)
+
+    def move_up(self, packed):
+        new_board, score = self._move_rows(self.transpose(packed), self.left_rows)
+        return self.transpose(new_board), score
+
+    def move_down(self, packed):
+        new_board, score = self._move_rows(self.transpose(packed), self.right_rows)
+        return self.transpose(new_board), score
+
+    def apply_move(self, board, move):
+        '''
+        Make a move on a game board through the packed representation.
+
+        Parameters:
+        - board: 2D array (size x size) representing the game board
+        - move: Function, one of the move methods of this engine (e.g., engine.move_left)
+
+        Returns:
+        - board: The updated board as a new array
+        - move_made: Flag indicating if any tile was pushed or merged
+        - score: The score obtained from merging
+        '''
+        packed = self.encode(board)
+        new_packed, score = move(packed)
+        return self.decode(new_packed), new_packed != packed, score
+
+    ######################## LEGALITY ###################################
+    def _rows_moved(self, packed, lookup):
+        for shift in self.row_shifts:
+            row = (packed >> shift) & self.row_mask
+            if lookup[row][0] != row:
+                return True
+        return False
+
+    def legal_directions(self, packed):
+        '''Return four flags, True for the moves that change the packed board, in the order left, up, down, right'''
+        transposed = self.transpose(packed)
+        return (self._rows_moved(packed, self.left_rows), self._rows_moved(transposed, self.left_rows),
+                self._rows_moved(transposed, self.right_rows), self._rows_moved(packed, self.right_rows))
+
+    def can_move(self, packed):
+        '''Check if a cell is empty or two neighbouring cells hold the same tile below 2**15, see bitboard.can_move'''
+        if _zero_nibbles(packed, self.cell_bits):
+            return True
+        mergeable = ~_full_nibbles(packed, self.cell_bits)
+        return bool((_zero_nibbles(packed ^ (packed >> CELL_BITS), self.horizontal_pair_bits)
+                     | _zero_nibbles(packed ^ (packed >> self.row_bits), self.vertical_pair_bits)) & mergeable)
+
+
+def _zero_nibbles(packed, low_bits):
+    # Fold every nibble onto its lowest bit, a zero nibble leaves that bit unset
+    folded = packed | (packed >> 1) | (packed >> 2) | (packed >> 3)
+    return ~folded & low_bits
+
+
+def _full_nibbles(packed, low_bits):
+    # Only a nibble holding 2**15 keeps its lowest bit set when all four bits are combined
+    return packed & (packed >> 1) & (packed >> 2) & (packed >> 3) & low_bits
+
+
+def get_engine(size):
+    '''Return the BoardEngine of a board size, it is made (and its row tables built) the first time'''
+    if size not in _ENGINES:
+        _ENGINES[size] = BoardEngine(size)
+    return _ENGINES[size]
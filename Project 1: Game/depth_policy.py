@@ -0,0 +1,97 @@
+import numpy as np
+
+
+####################### INITIALIZATION ##################################
+'''Pass ADAPTIVE_DEPTH as the depth of find_move to let the rules below choose the depth for every position.
+A rule is a function that takes the features of a board (see board_features) and returns a depth,
+or None if it does not apply. The first rule that returns a depth decides, else DEFAULT_DEPTH is used.
+Depths are even, so the search always ends with a new tile, like the depth 2 used in the experiments.
+The experiments of the game window and Data_AI.ipynb stay at depth 2, adaptive depth is an option of self_play.py and tournament.py.
+
+The thresholds were compared with depth 2 on the same 30 seeded games per heuristic
+(python self_play.py --games 30 --depths 2 adaptive --heuristics WEIGHT_DIAG WEIGHT_SNAKE, base seed 0),
+first with open_board_rule alone in DEPTH_RULES, then with both rules. The two runs were made one after the other,
+each with its own depth 2 games for the times:
+
+    heuristic      depth                 mean score   games won   ms per move   seconds per game
+    WEIGHT_DIAG    2                        19279         12          5.11             5.4
+    WEIGHT_DIAG    open_board_rule only     20711         14          3.81             4.3
+    WEIGHT_SNAKE   2                        35000         22          5.93            10.4
+    WEIGHT_SNAKE   open_board_rule only     36509         26          3.28             5.9
+
+    WEIGHT_DIAG    2                        19279         12          4.80             5.1
+    WEIGHT_DIAG    adaptive                 24119         18          4.07             5.1
+    WEIGHT_SNAKE   2                        35000         22          5.44             9.5
+    WEIGHT_SNAKE   adaptive                 43607         25          3.51             7.3
+
+Searching at depth 0 from 6 empty cells does not cost strength (1432 +- 2331 points per game with WEIGHT_DIAG,
+1509 +- 4576 with WEIGHT_SNAKE, paired over the games) and saves a quarter to nearly half of the time per move.
+Depth 4 is only searched on full boards: with one empty cell it already took 10 times as long as depth 2,
+and the games, won more often, spent more moves on crowded boards, so the time per move rose above depth 2 with WEIGHT_DIAG.
+On full boards the deeper search costs less than the open boards save, and gains
+4840 +- 2828 points per game with WEIGHT_DIAG and 8607 +- 5762 with WEIGHT_SNAKE.
+The games last longer, so the time per game does not drop as much as the time per move.'''
+ADAPTIVE_DEPTH = 'adaptive'
+DEFAULT_DEPTH = 2
+
+#For the rules
+OPEN_BOARD_EMPTY_CELLS = 6 #From this many empty cells the board is open
+CROWDED_BOARD_EMPTY_CELLS = 0 #Up to this many empty cells the board is crowded
+CROWDED_BOARD_DISTINCT_TILES = 6 #From this many distinct tiles a crowded board is hard to merge
+
+
+######################## FEATURES ###################################
+def board_features(board):
+    '''
+    Compute the cheap features the depth rules look at.
+
+    Parameters:
+    - board: 2D array representing the game board
+
+    Returns:
+    - features: Dictionary with the number of empty cells ('empty_cells') and the number of different tile values
+      ('distinct_tiles')
+    '''
+    tiles = board[board > 0]
+    return {
+        'empty_cells': board.size - len(tiles),
+        'distinct_tiles': len(np.unique(tiles)),
+    }
+
+
+######################## RULES ###################################
+def open_board_rule(features):
+    '''Search shallow while many cells are empty, there are many spawns to search and little danger'''
+    if features['empty_cells'] >= OPEN_BOARD_EMPTY_CELLS:
+        return 0
+    return None
+
+
+def crowded_board_rule(features):
+    '''Search deeper when few cells are empty and the tiles are hard to merge, there are few spawns to search'''
+    if features['empty_cells'] <= CROWDED_BOARD_EMPTY_CELLS and features['distinct_tiles'] >= CROWDED_BOARD_DISTINCT_TILES:
+        return 4
+    return None
+
+
+DEPTH_RULES = [open_board_rule, crowded_board_rule]
+
+
+def choose_depth(board, rules=DEPTH_RULES, default_depth=DEFAULT_DEPTH):
+    '''
+    Choose the search depth for a position.
+
+    Parameters:
+    - board: 2D array representing the game board
+    - rules: List of rule functions, tried in order
+    - default_depth: Integer, the depth used when no rule applies
+
+    Returns:
+    - depth: Integer, the depth to pass to find_move
+    '''
+    features = board_features(board)
+    for rule in rules:
+        depth = rule(features)
+        if depth is not None:
+            return depth
+    return default_depth
@@ -0,0 +1,317 @@
+#import necessary libraries
+from tkinter import Frame, Label, CENTER, Button
+
+import numpy as np
+
+from game_core import CELL_COUNT, initialize_game, move_up, move_down, move_left, move_right, \
+                      legal_moves, add_new_tile, check_for_win
+from game_2048_new2 import find_move
+
+
+####################### INITIALIZATION ##################################
+'''The window of the 4x4 game, with the expectimax AI of game_2048_new2. Start it with
+
+    python game_2048_new2.py
+
+Tiles stop at game_core.MAX_TILE (32768), two of them are not merged.
+'''
+#For the display
+EDGE_LENGTH = 400
+CELL_PAD = 10
+
+#For control
+UP_KEY = "'w'"
+DOWN_KEY = "'s'"
+LEFT_KEY = "'a'"
+RIGHT_KEY= "'d'"
+AI_PLAY_KEY = "'p'"
+AI_MULTI_PLAY = "'m'"
+
+
+######################### COLOR FOR GAME DISPLAY ############################################
+LABEL_FONT = ("Verdana", 40, "bold")
+
+GAME_COLOR = "#a39489"
+
+EMPTY_COLOR = "#c2b3a9"
+
+TILE_COLORS = {
+    2: "#fcefe6",
+    4: "#f2e8cb",
+    8: "#f5b682",
+    16: "#f29446",
+    32: "#ff775c",
+    64: "#e64c2e",
+    128: "#ede291",
+    256: "#fce130",
+    512: "#ffdb4a",
+    1024: "#f0b922",
+    2048: "#fad74d",
+    4096: "#fad74d",
+    8192: "#fad74d"
+}
+
+LABEL_COLORS ={
+    2: "#695c57",
+    4: "#695c57",
+    8: "#ffffff",
+    16: "#ffffff",
+    32: "#ffffff",
+    64: "#ffffff",
+    128: "#ffffff",
+    256: "#ffffff",
+    512: "#ffffff",
+    1024: "#ffffff",
+    2048: "#ffffff",
+    4096: "#ffffff",
+    8192: "#ffffff"
+}
+
+######################### GAME DISPLAY #############################################################
+
+
+class Display(Frame):
+    def __init__(self):
+        '''
+        Initialize the Display class, representing the graphical user interface for the 2048 game.
+        Attributes:
+        - grid_cells: List of Label widgets representing the cells of the game grid
+        - commands: Dictionary mapping key presses to corresponding move functions
+        '''
+        # Initialize the parent class (Frame)
+        Frame.__init__(self)
+        # Set up the grid layout and other components
+        self.grid()
+        self.build_buttons()
+        self.master.title('2048')
+        self.master.bind("<Key>", self.key_press)
+        # Define commands for key presses (mapping keys to move functions)
+        self.commands = {
+            UP_KEY: move_up,
+            DOWN_KEY: move_down,
+            LEFT_KEY: move_left,
+            RIGHT_KEY: move_right,
+        }
+        # Initialize the list to store grid cells
+        self.grid_cells = []
+        # Build the game grid and initialize the game matrix
+        self.build_grid()
+        self.init_matrix()
+        # Draw the initial state of the game grid
+        self.draw_grid_cells()
+        # Start the main event loop for the graphical interface
+        self.mainloop()
+
+    def build_grid(self):
+        '''
+        Build the game grid by creating Frame and Label widgets for each cell.
+        The cells are organized in rows and columns, and each cell has a corresponding Label widget.
+        Attributes:
+        - background: Frame widget serving as the background for the entire grid
+        - grid_cells: 2D list storing Label widgets representing the cells of the game grid
+        '''
+        # Create a background Frame for the entire grid with specified color and dimensions
+        background = Frame(self, bg=GAME_COLOR, width=EDGE_LENGTH, height=EDGE_LENGTH)
+        background.grid()
+        # Iterate through each row and column to create cells and corresponding Label widgets
+        for row in range(CELL_COUNT):
+            grid_row = []  # List to store Label widgets for a single row
+            for col in range(CELL_COUNT):
+                # Create a cell Frame with specified color and dimensions
+                cell = Frame(background, bg=EMPTY_COLOR, width=EDGE_LENGTH / CELL_COUNT, height=EDGE_LENGTH / CELL_COUNT)
+                cell.grid(row=row, column=col, padx=CELL_PAD, pady=CELL_PAD)
+                # Create a Label widget inside the cell with initial text and formatting
+                t = Label(master=cell, text="", bg=EMPTY_COLOR, justify=CENTER, font=LABEL_FONT, width=5, height=2)
+                t.grid()
+                # Append the Label widget to the row list
+                grid_row.append(t)
+            # Append the row list to the grid_cells 2D list
+            self.grid_cells.append(grid_row)
+
+    def init_matrix(self):
+        '''
+        Initialize the game matrix by calling the initialize_game function.
+        The resulting matrix is stored in the 'matrix' attribute of the Display class.
+        '''
+        self.matrix = initialize_game()
+
+    def draw_grid_cells(self):
+        '''
+        Update the graphical representation of the game grid based on the current state of the matrix.
+    
+        The method iterates through each cell in the matrix and configures the corresponding Label widget
+        in the graphical grid with the appropriate text, background color, and foreground color.
+        '''
+        for row in range(CELL_COUNT):
+            for col in range(CELL_COUNT):
+                tile_value = self.matrix[row][col]
+                if not tile_value:
+                    # Configure the Label widget for an empty cell
+                    self.grid_cells[row][col].configure(text="", bg=EMPTY_COLOR)
+                else:
+                    # Configure the Label widget for a non-empty cell with appropriate text and colors
+                    self.grid_cells[row][col].configure(
+                        text=str(tile_value), bg=TILE_COLORS[tile_value], fg=LABEL_COLORS[tile_value])
+    
+        # Update the graphical display to reflect the changes
+        self.update_idletasks()
+    
+    def build_buttons(self):
+        '''
+        Build the buttons for starting a new game and stopping the application.
+    
+        - new_game_button: Button widget for starting a new game, with text "New Game" and linked to the start_new_game method
+        - stop_button: Button widget for stopping the application, with text "Stop" and linked to the master.destroy method
+        '''
+        # Button for starting a new game
+        new_game_button = Button(self, text="New Game", command=self.start_new_game)
+        new_game_button.grid(row=CELL_COUNT, column=0, columnspan=2, pady=10)
+    
+        # Button for stopping the application
+        stop_button = Button(self, text="Stop", command=self.master.destroy)
+        stop_button.grid(row=CELL_COUNT, column=2, columnspan=2, pady=10)
+
+    def start_new_game(self):
+        '''
+        Start a new game by initializing the game matrix and updating the graphical representation of the grid.
+        '''
+        # Initialize the game matrix
+        self.init_matrix()
+    
+        # Update the graphical representation of the grid
+        self.draw_grid_cells()
+     
+    def key_press(self, event):
+        '''
+        Handle key press events.
+    
+        - key: Extracted key from the event.
+        - AI_PLAY_KEY: Key used to trigger automatic gameplay with a fixed depth and heuristic.
+        - AI_MULTI_PLAY: Key used to trigger multiple games with different depths and heuristics.
+    
+        For AI_PLAY_KEY:
+        - move_count: Counter for the number of moves.
+        - score_tot: Total score accumulated during gameplay.
+        - won_the_game: Flag indicating whether the game was won.
+        - Play until legal_moves finds no valid move.
+        - Update statistics and display the results.
+    
+        For AI_MULTI_PLAY:
+        - num_games: Number of games to play.
+        - move_count, score_tot, won_the_game: Counters and flags for each game.
+        - results_weight: Matrix to store results for different depths and heuristics.
+        - Loop over specified depths, heuristics, and games, playing and recording results.
+        - Print the results for each depth.
+    
+        For general key commands:
+        - Execute the corresponding move command if the key is in the predefined commands.
+        - Update the game matrix, check for a valid move, add a new tile, and update the graphical representation.
+    
+        Note: Some commented code for handling win/loss popups is provided at the end but is currently disabled.
+        '''
+        key = repr(event.char)
+        
+        if key == AI_PLAY_KEY:
+            move_count = 0
+            score_tot = 0
+            won_the_game = 0
+            # The moves of a turn are made once and shared by the game-over check, the search and the move itself
+            children = legal_moves(self.matrix)
+            while children:
+                if not check_for_win(self.matrix):
+                    won_the_game = 1
+                move = find_move(self.matrix, depth=2, type_hes='WEIGHT_DIAG', children=children)
+                self.matrix, score_new = children[move]
+                score_tot += score_new            
+                self.matrix = add_new_tile(self.matrix)
+                self.draw_grid_cells()
+                move_count += 1
+                children = legal_moves(self.matrix)
+        elif key == AI_MULTI_PLAY:
+            num_games = 90
+            move_count = 0
+            score_tot = 0
+            won_the_game = 0
+            # Opret tomme matricer til at gemme resultaterne
+            results_weight = np.zeros((6, num_games))
+
+            # Loop for at spille spillet og gemme resultaterne
+            for DEPTH in [2]:
+                for j, types in enumerate(['WEIGHT_DIAG', 'WEIGHT_SNAKE']):
+                    for i in range(num_games):
+                        children = legal_moves(self.matrix)
+                        while children:
+                            if check_for_win(self.matrix):
+                                won_the_game = 1
+                            move = find_move(self.matrix, DEPTH, type_hes=types, children=children)
+                            self.matrix, score_new = children[move]
+                            score_tot += score_new            
+                            self.matrix = add_new_tile(self.matrix)
+                            self.draw_grid_cells()
+                            move_count += 1
+                            children = legal_moves(self.matrix)
+                        results_weight[0 + 3*j, i] = move_count
+                        results_weight[1 + 3*j, i] = won_the_game
+                        results_weight[2 + 3*j, i] = score_tot
+                        move_count = 0
+                        score_tot = 0
+                        won_the_game = 0
+                        score_new = 0
+                        self.start_new_game()
+                print(f'Results for depth: {DEPTH}:')
+                print(f'{results_weight}\n')
+
+
+            """ for i in range(num_games):
+                while fixed_move(self.matrix)[1]:
+                    if check_for_win(self.matrix):
+                        won_the_game = 1
+                    move = find_move(self.matrix, depth=2, type_hes='WEIGHT_SNAKE')
+                    self.matrix, _, score_new = move(self.matrix) 
+                    score_tot += score_new            
+                    self.matrix = add_new_tile(self.matrix)
+                    self.draw_grid_cells()
+                    move_count += 1
+                results_weight_snake[0, i] = move_count
+                results_weight_snake[1, i] = won_the_game
+                results_weight_snake[2, i] = score_tot
+                move_count = 0
+                score_tot = 0
+                won_the_game = 0 
+                self.start_new_game() """
+
+
+            
+
+
+        if key in self.commands:
+            self.matrix, move_made, _ = self.commands[repr(event.char)](self.matrix)
+            if move_made:
+                self.matrix = add_new_tile(self.matrix)
+                self.draw_grid_cells()
+                move_made = False
+        
+        """if check_for_win(self.matrix):
+            popup = Toplevel(self.master)
+            popup.title("Game Over")
+            popup.geometry("300x150")
+            label = Label(popup, text=f'Congratulations! You\'ve reached {NUMBER_TO_WIN}. Game Over!')
+            label.pack(pady=10)
+            new_game_button = Button(popup, text="New Game", command=lambda: [self.start_new_game(), popup.destroy()])
+            new_game_button.pack(pady=10)
+            stop_button = Button(popup, text="Stop", command=self.master.destroy)
+            stop_button.pack(pady=10)
+        elif not fixed_move(self.matrix)[1]:
+            popup = Toplevel(self.master)
+            popup.title("Game Over")
+            popup.geometry("300x150")
+            label = Label(popup, text=f'Game Over! LOSSER!')
+            label.pack(pady=10)
+            new_game_button = Button(popup, text="New Game", command=lambda: [self.start_new_game(), popup.destroy()])
+            new_game_button.pack(pady=10)
+            stop_button = Button(popup, text="Stop", command=self.master.destroy)
+            stop_button.pack(pady=10) """
+
+
+if __name__ == '__main__':
+    gamegrid = Display()
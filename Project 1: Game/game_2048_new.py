@@ -3,17 +3,17 @@ from tkinter import Frame, Label, CENTER, messagebox, Toplevel, Button
 import numpy as np
 import math
 
+from game_core import NUMBER_TO_WIN, initialize_game, move_up, move_down, move_left, move_right, \
+                      fixed_move, add_new_tile, check_for_win
+
 
 ####################### INITIALIZATION ##################################
 #For the display
 EDGE_LENGTH = 400
 CELL_PAD = 10
 
-#For the game 
-POSSIBLE_MOVES_COUNT = 4 #Up, down, left and right
+#For the game, the rules are those of game_core, tiles stop at game_core.MAX_TILE (32768)
 CELL_COUNT = 4 #Numbers of cells on the diagonal
-NUMBER_OF_SQUARES = CELL_COUNT * CELL_COUNT
-NEW_TILE_DISTRIBUTION = np.array([2, 2, 2, 2, 2, 2, 2, 2 ,2, 4])
 
 #For control
 UP_KEY = "'w'"
@@ -23,121 +23,9 @@ RIGHT_KEY= "'d'"
 AI_PLAY_KEY = "'p'"
 
 #For AI control 
-NUMBER_TO_WIN = 2048
 NUMBER_OF_MOVES = 4 
 
 
-######################## GAME FUNCTION ###################################
-'''The code below will initialize the game and place a 2 tile at a ramdom place'''
-def initialize_game():
-    board = np.zeros((NUMBER_OF_SQUARES), dtype="int")
-    initial_twos = np.random.default_rng().choice(NUMBER_OF_SQUARES, 2, replace=False)
-    board[initial_twos] = 2
-    board = board.reshape((CELL_COUNT, CELL_COUNT))
-    return board
-
-'''The function below will remove all the tiles to the rigth of the board and check if any move has been done. Else it will return false for move_done'''
-def push_board_right(board):
-    new = np.zeros((CELL_COUNT, CELL_COUNT), dtype="int")
-    move_done = False
-    for row in range(CELL_COUNT):
-        count = CELL_COUNT - 1
-        for col in range(CELL_COUNT - 1, -1, -1):
-            if board[row][col] != 0:
-                new[row][count] = board[row][col]
-                if col != count:
-                    move_done = True
-                count -= 1
-    return (new, move_done)
-
-'''Merge the tiles together and return a board that is not compressed'''
-def merge_elements(board):
-    score = 0
-    merge_done = False
-    for row in range(CELL_COUNT):
-        for col in range(CELL_COUNT - 1, 0, -1):
-            if board[row][col] == board[row][col-1] and board[row][col] != 0:
-                board[row][col] *= 2
-                score += board[row][col]
-                board[row][col-1] = 0
-                merge_done = True
-    return (board, merge_done, score)
-
-'''For all of the moves below the board will be rotated so the push_board_right can be applied. 
-Afterwards the merge_element will be applied an a second push is need to compress the tiles. 
-lastly mode_made is used to check if the mode is valid, either tiles should be merged or some tiles so change its location for the move to be valid'''
-def move_up(board):
-    rotated_board = np.rot90(board, -1)
-    pushed_board, has_pushed = push_board_right(rotated_board)
-    merged_board, has_merged, score = merge_elements(pushed_board)
-    second_pushed_board, _ = push_board_right(merged_board)
-    rotated_back_board = np.rot90(second_pushed_board)
-    move_made = has_pushed or has_merged
-    return rotated_back_board, move_made, score
-
-    
-def move_down(board):
-    board = np.rot90(board)
-    board, has_pushed = push_board_right(board)
-    board, has_merged, score = merge_elements(board)
-    board, _ = push_board_right(board)
-    board = np.rot90(board, -1)
-    move_made = has_pushed or has_merged
-    return board, move_made, score
-
-
-def move_left(board):
-    board = np.rot90(board, 2)
-    board, has_pushed = push_board_right(board)
-    board, has_merged, score = merge_elements(board)
-    board, _ = push_board_right(board)
-    board = np.rot90(board, -2)
-    move_made = has_pushed or has_merged
-    return board, move_made, score
-
-
-def move_right(board):
-    board, has_pushed = push_board_right(board)
-    board, has_merged, score = merge_elements(board)
-    board, _ = push_board_right(board)
-    move_made = has_pushed or has_merged
-    return board, move_made, score
-
-'''The function checks for valid moves if it returns false then the game is over'''
-def fixed_move(board):
-    move_order = [move_left, move_up, move_down, move_right]
-    for func in move_order:
-        new_board, move_made, _ = func(board)
-        if move_made:
-            return new_board, True
-    return board, False
-
-
-def random_move(board):
-    move_made = False
-    move_order = [move_right, move_up, move_down, move_left]
-    while not move_made and len(move_order) > 0:
-        move_index = np.random.randint(0, len(move_order))
-        move = move_order[move_index]
-        board, move_made, score  = move(board)
-        if move_made:
-            return board, True, score
-        move_order.pop(move_index)
-    return board, False, score
-
-
-def add_new_tile(board):
-    tile_value = NEW_TILE_DISTRIBUTION[np.random.randint(0, len(NEW_TILE_DISTRIBUTION))]
-    tile_row_options, tile_col_options = np.nonzero(np.logical_not(board))
-    tile_loc = np.random.randint(0, len(tile_row_options))
-    board[tile_row_options[tile_loc], tile_col_options[tile_loc]] = tile_value
-    return board
-
-
-def check_for_win(board):
-    return NUMBER_TO_WIN in board
-
-
 ######################### COLOR FOR GAME DISPLAY ############################################
 LABEL_FONT = ("Verdana", 40, "bold")
 
@@ -376,4 +264,5 @@ class Display(Frame):
             stop_button.pack(pady=10)
 
 
-gamegrid = Display()
+if __name__ == '__main__':
+    gamegrid = Display()
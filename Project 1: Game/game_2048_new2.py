@@ -1,231 +1,24 @@
 #import necessary libraries
-from tkinter import Frame, Label, CENTER, messagebox, Toplevel, Button
-
 import numpy as np
 import math
+import multiprocessing
+import time
 
+import batch_search
+import bitboard
+from depth_policy import ADAPTIVE_DEPTH, choose_depth
+from game_core import legal_moves, move_left, move_up, move_down, move_right
+from heuristics import Heuristic, register_heuristic, get_heuristic, feature_tables
+from search_stats import MAX_NODE, CHANCE_NODE, LEAF
+from transposition import TranspositionTable
 
-####################### INITIALIZATION ##################################
-# Constants for the display and game parameters
-#For the display
-EDGE_LENGTH = 400
-CELL_PAD = 10
 
-#For the game 
-POSSIBLE_MOVES_COUNT = 4 #Up, down, left and right
+####################### INITIALIZATION ##################################
+'''The expectimax AI of the 4x4 game. The rules of the game are in game_core and the window in game_2048_gui,
+which is only imported when this file is run, so search workers and headless runs do not need tkinter or a display.'''
+#For AI control 
 NUMBER_OF_MOVES = 4 
 
-#For control
-UP_KEY = "'w'"
-DOWN_KEY = "'s'"
-LEFT_KEY = "'a'"
-RIGHT_KEY= "'d'"
-AI_PLAY_KEY = "'p'"
-AI_MULTI_PLAY = "'m'"
-
-#For AI control 
-NUMBER_TO_WIN = 2048
-CELL_COUNT = 4 #Numbers of cells on the diagonal
-NUMBER_OF_SQUARES = CELL_COUNT * CELL_COUNT
-NEW_TILE_DISTRIBUTION = np.array([2, 2, 2, 2, 2, 2, 2, 2 ,2, 4])
-
-
-
-
-######################## GAME FUNCTION ###################################
-'''The code below will initialize the game and place a 2 tile at a random place'''
-def initialize_game():
-    board = np.zeros((NUMBER_OF_SQUARES), dtype="int")
-    initial_twos = np.random.default_rng().choice(NUMBER_OF_SQUARES, 2, replace=False)
-    board[initial_twos] = 2
-    board = board.reshape((CELL_COUNT, CELL_COUNT))
-    return board
-
-'''The function below will remove all the tiles to the right of the board and check if any move has been done. Else it will return false for move_done'''
-def push_board_right(board):
-    new = np.zeros((CELL_COUNT, CELL_COUNT), dtype="int")
-    move_done = False
-    for row in range(CELL_COUNT):
-        count = CELL_COUNT - 1
-        for col in range(CELL_COUNT - 1, -1, -1):
-            if board[row][col] != 0:
-                new[row][count] = board[row][col]
-                if col != count:
-                    move_done = True
-                count -= 1
-    return (new, move_done)
-
-'''Merge the tiles and return a board that is not compressed'''
-def merge_elements(board):
-    score = 0
-    merge_done = False
-    for row in range(CELL_COUNT):
-        for col in range(CELL_COUNT - 1, 0, -1):
-            if board[row][col] == board[row][col-1] and board[row][col] != 0:
-                board[row][col] *= 2
-                score += board[row][col]
-                board[row][col-1] = 0
-                merge_done = True
-    return (board, merge_done, score)
-
-'''For all of the moves below the board will be rotated so the push_board_right can be applied. 
-Afterwards the merge_element will be applied an a second push is need to compress the tiles. 
-lastly mode_made is used to check if the mode is valid, either tiles should be merged or some tiles so change its location for the move to be valid'''
-
-def move_up(board):
-    # Rotate the board 90 degrees counterclockwise to make the "up" movement
-    rotated_board = np.rot90(board, -1)
-    # Move tiles to the right, checking if any tiles were pushed
-    pushed_board, has_pushed = push_board_right(rotated_board)
-    # Merge tiles together, calculate the score obtained from merging
-    merged_board, has_merged, score = merge_elements(pushed_board)
-    # Push the tiles to the right again after merging
-    second_pushed_board, _ = push_board_right(merged_board)
-    # Rotate the board back to its original orientation
-    rotated_back_board = np.rot90(second_pushed_board)
-    # Check if any move (push or merge) was made
-    move_made = has_pushed or has_merged
-    # Return the updated board, a flag indicating if a move was made, and the score obtained
-    return rotated_back_board, move_made, score
-
-
-    
-def move_down(board):
-    # Rotate the board 90 degrees clockwise to make the "down" movement
-    board = np.rot90(board)
-    # Move tiles to the right, checking if any tiles were pushed
-    board, has_pushed = push_board_right(board)
-    # Merge tiles together, calculate the score obtained from merging
-    board, has_merged, score = merge_elements(board)
-    # Push the tiles to the right again after merging
-    board, _ = push_board_right(board)
-     # Rotate the board back to its original orientation
-    board = np.rot90(board, -1)
-    # Check if any move (push or merge) was made
-    move_made = has_pushed or has_merged
-    # Return the updated board, a flag indicating if a move was made, and the score obtained
-    return board, move_made, score
-
-
-def move_left(board):
-   # Rotate the board 180 degrees to make the "left" movement
-    board = np.rot90(board, 2)
-    # Move tiles to the right, checking if any tiles were pushed
-    board, has_pushed = push_board_right(board)
-    # Merge tiles together, calculate the score obtained from merging
-    board, has_merged, score = merge_elements(board)
-    # Push the tiles to the right again after merging
-    board, _ = push_board_right(board)
-    # Rotate the board back to its original orientation
-    board = np.rot90(board, -2)
-    # Check if any move (push or merge) was made
-    move_made = has_pushed or has_merged
-    # Return the updated board, a flag indicating if a move was made, and the score obtained
-    return board, move_made, score
-
-
-def move_right(board):
-    # Move tiles to the right, checking if any tiles were pushed
-    board, has_pushed = push_board_right(board)
-    # Merge tiles together, calculate the score obtained from merging
-    board, has_merged, score = merge_elements(board)
-    # Push the tiles to the right again after merging
-    board, _ = push_board_right(board)
-    # Check if any move (push or merge) was made
-    move_made = has_pushed or has_merged
-    # Return the updated board, a flag indicating if a move was made, and the score obtained
-    return board, move_made, score
-    
-
-'''The function checks for valid moves if it returns false then the game is over'''
-def fixed_move(board):
-   # Define the order of moves to be checked
-    move_order = [move_left, move_up, move_down, move_right]
-    # Iterate through the moves and check if any of them are valid
-    for func in move_order:
-        new_board, move_made, _ = func(board)
-        if move_made:
-            return new_board, True  # Return the updated board and a flag indicating a valid move
-    return board, False  # If no valid move is found, return the original board and a flag indicating game over
-
-
-def random_move(board):
-    # Initialize flag to track if a move was made
-    move_made = False
-    # Define the order of moves to be tried randomly
-    move_order = [move_right, move_up, move_down, move_left]
-    # Continue trying random moves until a valid move is made or all moves are exhausted
-    while not move_made and len(move_order) > 0:
-        # Select a random move from the remaining ones
-        move_index = np.random.randint(0, len(move_order))
-        move = move_order[move_index]
-        # Apply the selected move and check if it was valid
-        board, move_made, score = move(board)
-        # If a valid move is found, return the updated board and a flag indicating a valid move
-        if move_made:
-            return board, True, score
-        # Remove the used move from the list
-        move_order.pop(move_index)
-    # If no valid move is found, return the original board and a flag indicating no move made
-    return board, False, score
-
-
-def add_new_tile(board):
-    # Randomly choose a tile value from the distribution
-    tile_value = NEW_TILE_DISTRIBUTION[np.random.randint(0, len(NEW_TILE_DISTRIBUTION))]
-    # Get the positions of empty cells on the board
-    tile_row_options, tile_col_options = np.nonzero(np.logical_not(board))
-    # Randomly choose an empty cell to place the new tile
-    tile_loc = np.random.randint(0, len(tile_row_options))
-    # Place the new tile in the selected empty cell
-    board[tile_row_options[tile_loc], tile_col_options[tile_loc]] = tile_value
-    # Return the updated board
-    return board
-
-
-def check_for_win(board):
-    # Check if the winning tile value is present on the board
-    return NUMBER_TO_WIN in board
-    
-
-######################### COLOR FOR GAME DISPLAY ############################################
-LABEL_FONT = ("Verdana", 40, "bold")
-
-GAME_COLOR = "#a39489"
-
-EMPTY_COLOR = "#c2b3a9"
-
-TILE_COLORS = {
-    2: "#fcefe6",
-    4: "#f2e8cb",
-    8: "#f5b682",
-    16: "#f29446",
-    32: "#ff775c",
-    64: "#e64c2e",
-    128: "#ede291",
-    256: "#fce130",
-    512: "#ffdb4a",
-    1024: "#f0b922",
-    2048: "#fad74d",
-    4096: "#fad74d",
-    8192: "#fad74d"
-}
-
-LABEL_COLORS ={
-    2: "#695c57",
-    4: "#695c57",
-    8: "#ffffff",
-    16: "#ffffff",
-    32: "#ffffff",
-    64: "#ffffff",
-    128: "#ffffff",
-    256: "#ffffff",
-    512: "#ffffff",
-    1024: "#ffffff",
-    2048: "#ffffff",
-    4096: "#ffffff",
-    8192: "#ffffff"
-}
 
 ######################## AI GAME #########################################
 
@@ -240,6 +33,34 @@ WEIGHT_DIAG = np.array([[2**7, 2**6, 2**5, 2**4],
                         [2**5, 2**4, 2**3, 2**2], 
                         [2**4, 2**3, 2**2, 2**1]])
 
+# The weight matrices are registered as heuristics, more are defined in heuristics.py
+register_heuristic('WEIGHT_SNAKE', Heuristic({'positional': 1}, WEIGHT_SNAKE))
+register_heuristic('WEIGHT_DIAG', Heuristic({'positional': 1}, WEIGHT_DIAG))
+
+# Transposition tables shared by all searches, one per heuristic and pruning setting since the stored values depend on both
+TRANSPOSITION_TABLE_SIZE = 200000
+TRANSPOSITION_TABLES = {}
+
+
+def get_transposition_table(type_hes, pruning=None):
+    '''
+    Return the shared transposition table of a heuristic, creating it the first time it is needed.
+    Positions that are rotations or reflections of each other share an entry if the weights of the heuristic
+    do not change under that symmetry.
+
+    Parameters:
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - pruning: Tuple (probability_cutoff, max_spawn_cells) the values are searched with, by default search_pruning()
+
+    Returns:
+    - table: TranspositionTable storing expectimax values for the heuristic and pruning setting
+    '''
+    if pruning is None:
+        pruning = search_pruning()
+    if (type_hes, pruning) not in TRANSPOSITION_TABLES:
+        symmetries = get_heuristic(type_hes).symmetries()
+        TRANSPOSITION_TABLES[(type_hes, pruning)] = TranspositionTable(TRANSPOSITION_TABLE_SIZE, symmetries=symmetries)
+    return TRANSPOSITION_TABLES[(type_hes, pruning)]
 
 
 def heuristic(board, type_hes = 'WEIGHT_SNAKE'):
@@ -248,26 +69,102 @@ def heuristic(board, type_hes = 'WEIGHT_SNAKE'):
 
     Parameters:
     - board: 2D array representing the game board
-    - type_hes: String, either 'WEIGHT_SNAKE' or 'WEIGHT_DIAG', specifying the heuristic type
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
 
     Returns:
     - h: Heuristic value calculated based on the specified heuristic type
     '''
-    # Select the appropriate weight matrix based on the heuristic type
-    if type_hes == 'WEIGHT_SNAKE':
-        WEIGHT = WEIGHT_SNAKE
-    else:
-        WEIGHT = WEIGHT_DIAG
-
-    h = 0
-    # Iterate through each cell on the board and calculate the heuristic value
-    for i in range(CELL_COUNT):
-        for j in range(CELL_COUNT):
-            h += board[i, j] * WEIGHT[i, j]
-    # Return the final heuristic value
-    return h
-
-def expectimax(board, depth, move, type_hes):
+    # Look up the heuristic type in the registry and score the board with it
+    return get_heuristic(type_hes).evaluate_board(board)
+
+
+def heuristic_batch(boards, type_hes = 'WEIGHT_SNAKE'):
+    '''
+    Calculate the heuristic value for a stack of game boards in a single call.
+
+    Parameters:
+    - boards: 3D array (N x 4 x 4) of game boards
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+
+    Returns:
+    - h: 1D array with the heuristic value of every board
+    '''
+    return get_heuristic(type_hes).evaluate_boards(boards)
+
+
+def transform_move(move, symmetry, inverse=False):
+    '''
+    Map a move through a board symmetry: the move on the image of a board that matches the move on the board.
+    Parameters:
+    - move: Move function, or None
+    - symmetry: Integer, index into bitboard.SYMMETRIES
+    - inverse: Boolean, map a move on the image back to the move on the board instead
+    Returns:
+    - move: The mapped move function, None stays None
+    '''
+    if move is None or symmetry == bitboard.IDENTITY:
+        return move
+    moves = [move_left, move_up, move_down, move_right]
+    images = bitboard.SYMMETRY_MOVES[symmetry]
+    if inverse:
+        return moves[images.index(moves.index(move))]
+    return moves[images[moves.index(move)]]
+
+
+# Pruning of chance nodes, the default values search the full tree.
+# A search reads them once when it starts and passes them down, also to the workers of a pool
+PROBABILITY_CUTOFF = 0.0 #Boards reached with a lower probability are scored with the heuristic instead of searched, without the transposition table
+MAX_SPAWN_CELLS = None #If set, at most this many empty cells are searched for the new tile
+
+
+def search_pruning():
+    '''Return the current pruning setting as a tuple (PROBABILITY_CUTOFF, MAX_SPAWN_CELLS)'''
+    return (PROBABILITY_CUTOFF, MAX_SPAWN_CELLS)
+
+
+def sample_spawn_cells(empty_cells, max_spawn_cells):
+    '''
+    Pick the empty cells a chance node searches, at most max_spawn_cells of them.
+    The cells are spread evenly over the board instead of drawn at random, so a search always gives the same value.
+    Parameters:
+    - empty_cells: 2D array with the (row, col) of every empty cell
+    - max_spawn_cells: Integer, or None to search every empty cell
+    Returns:
+    - spawn_cells: 2D array with the (row, col) of the cells to search
+    '''
+    if max_spawn_cells is None or len(empty_cells) <= max_spawn_cells:
+        return empty_cells
+    index = np.linspace(0, len(empty_cells) - 1, max_spawn_cells).round().astype(int)
+    return empty_cells[index]
+
+
+def spawn_boards(board, max_spawn_cells=None):
+    '''
+    Build the boards a chance node searches by adding a new tile, together with their probabilities.
+
+    Parameters:
+    - board: 2D array representing the game board, with at least one empty cell
+    - max_spawn_cells: Integer, the new tile is only put in the cells chosen by sample_spawn_cells, or None for every empty cell
+
+    Returns:
+    - boards: 3D array with one board per searched cell and tile value (2 first, then 4)
+    - probabilities: 1D array with the probability of each board in the game, they add up to less than 1
+      when cells are left out
+    '''
+    empty_cells = np.argwhere(board == 0)
+    spawn_cells = sample_spawn_cells(empty_cells, max_spawn_cells)
+    spawn_count = len(spawn_cells)
+    boards = np.repeat(board[np.newaxis], 2 * spawn_count, axis=0)
+    boards[np.arange(2 * spawn_count), np.tile(spawn_cells[:, 0], 2), np.tile(spawn_cells[:, 1], 2)] = np.repeat([2, 4], spawn_count)
+    probabilities = np.repeat([0.9, 0.1], spawn_count) / len(empty_cells)
+    return boards, probabilities
+
+
+class SearchTimeout(Exception):
+    '''Raised inside expectimax when the deadline of a timed search has passed'''
+
+
+def expectimax(board, depth, move, type_hes, table=None, deadline=None, probability=1.0, stats=None, pruning=None):
     '''
     Perform the Expectimax algorithm to evaluate possible moves and choose the best move.
 
@@ -275,329 +172,399 @@ def expectimax(board, depth, move, type_hes):
     - board: 2D array representing the game board
     - depth: Integer, the current depth in the search tree
     - move: Function, the move function (e.g., move_left, move_up) to be considered
-    - type_hes: String, either 'WEIGHT_SNAKE' or 'WEIGHT_DIAG', specifying the heuristic type
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - table: TranspositionTable for the heuristic, or None to search without caching
+    - deadline: Optional time.perf_counter() value, SearchTimeout is raised once it has passed
+    - probability: Float, the probability of reaching this board from the root, compared with the probability cutoff
+    - stats: Optional SearchStats counting the visited nodes
+    - pruning: Tuple (probability_cutoff, max_spawn_cells), by default search_pruning().
+      The table must hold values searched with the same setting, see get_transposition_table.
+      The table is not used when the probability cutoff is above 0
 
     Returns:
     - score: The calculated score representing the desirability of the current move
     - selected_move: The selected move function for the current depth
     '''
+    if pruning is None:
+        pruning = search_pruning()
+    probability_cutoff, max_spawn_cells = pruning
+    # With a cutoff the value of a board depends on the probability it is reached with, not only on the board and depth,
+    # so it cannot be cached under (board, depth)
+    if probability_cutoff > 0:
+        table = None
     # Base case: if depth reaches 0 or less, return the heuristic value of the current board
     if depth < 0:
+        if stats is not None:
+            stats.visit(LEAF, depth)
+        return heuristic(board, type_hes), move
+    # Unlikely boards are not worth searching
+    if probability < probability_cutoff:
+        if stats is not None:
+            stats.visit(LEAF, depth)
         return heuristic(board, type_hes), move
+    # Stop a timed search as soon as its time is up
+    if deadline is not None and time.perf_counter() > deadline:
+        raise SearchTimeout
+    packed = bitboard.encode_board(board)
+    # Reuse the value if the same position was already searched to the same depth
+    if table is not None:
+        # Images of the board under the symmetries of the table share one entry
+        key, symmetry = table.canonical(packed)
+        cached = table.get(key, depth)
+        if stats is not None:
+            if cached is not None:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+        if cached is not None:
+            max_score, selected_move = cached
+            return max_score, transform_move(selected_move, symmetry, inverse=True) or move
     # If it's the AI's turn to move
     if depth % 2 == 0:
+        if stats is not None:
+            stats.visit(CHANCE_NODE, depth)
         # If no empty cells are left, return the heuristic value of the current board
         if np.sum((board == 0).astype('int')) == 0:
             total_score = heuristic(board, type_hes)
+        elif depth == 0:
+            # The children are leaves, so score them straight from the packed board with the row tables
+            total_score = get_heuristic(type_hes).evaluate_spawns(packed)
+            if stats is not None:
+                stats.visit(LEAF, depth - 1, 2 * int(np.sum(board == 0)))
         else:
             empty_cells = np.argwhere(board == 0)
+            spawn_cells = sample_spawn_cells(empty_cells, max_spawn_cells)
             total_score = 0
             # Consider possible new tiles with their respective weights
             for tile_value, weight in [(2, 0.9), (4, 0.1)]:
-                for empty_cell in empty_cells:
+                # Probability of reaching the new board, with the tile in any one of the empty cells
+                new_probability = probability * weight / len(empty_cells)
+                for empty_cell in spawn_cells:
                     row, col = empty_cell
                     new_board = np.copy(board)
                     new_board[row, col] = tile_value
-                    new_score, _ = expectimax(new_board, depth - 1, move, type_hes)
-                    total_score += 1. * weight * new_score / len(empty_cells)
+                    new_score, _ = expectimax(new_board, depth - 1, move, type_hes, table, deadline, new_probability, stats, pruning)
+                    total_score += 1. * weight * new_score / len(spawn_cells)
+        if table is not None:
+            table.put(key, depth, (total_score, None))
         return total_score, move
     # If it's the chance node's turn (opponent's turn)
     elif depth % 2 == 1:
+        if stats is not None:
+            stats.visit(MAX_NODE, depth)
         max_score = -math.inf
+        selected_move = move
         # Iterate through all possible player moves and choose the one with the maximum score
-        for move_player in [move_left, move_up, move_down, move_right]:
-            new_board, move_made, _ = move_player(np.copy(board))
-            if move_made:
-                new_score, _ = expectimax(np.copy(new_board), depth - 1, move_player, type_hes)
-                if new_score > max_score:
-                    max_score = new_score
-                    selected_move = move_player
+        for move_player, (new_board, _) in legal_moves(board).items():
+            new_score, _ = expectimax(new_board, depth - 1, move_player, type_hes, table, deadline, probability, stats, pruning)
+            if new_score > max_score:
+                max_score = new_score
+                selected_move = move_player
+        if table is not None:
+            table.put(key, depth, (max_score, transform_move(selected_move, symmetry)))
         return max_score, selected_move
 
 
-def find_move(board, depth, type_hes):
+def find_move(board, depth, type_hes, table=None, pool=None, stats=None, children=None):
     '''
     Find the best move using the Expectimax algorithm.
     Parameters:
     - board: 2D array representing the game board
-    - depth: Integer, the depth of the search tree for the Expectimax algorithm
-    - type_hes: String, either 'WEIGHT_SNAKE' or 'WEIGHT_DIAG', specifying the heuristic type
+    - depth: Integer, the depth of the search tree for the Expectimax algorithm, or ADAPTIVE_DEPTH to let depth_policy choose it
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - table: TranspositionTable to cache values in, by default the shared table of the heuristic
+    - pool: Optional process pool (see get_search_pool) to search the root moves in parallel
+    - stats: Optional SearchStats, filled with the node counts and timings of this call.
+      With a pool only the total time is measured, the nodes are counted in the worker processes
+    - children: Optional result of legal_moves(board), computed here if not given
     Returns:
     - next_move: The best move function determined by the Expectimax algorithm
     '''
     # Initialize variables to track the maximum value and the next move
     max_value = -float('inf')
     next_move = None
-    # Iterate through all possible moves
-    for move in [move_left, move_up, move_down, move_right]:
-        # Create a copy of the board to simulate the move
-        board_copy = np.copy(board)
-        board_new, move_made, _ = move(board_copy)
-
-        # If the move is valid, evaluate its value using the Expectimax algorithm
-        if move_made == True:
-            value, _ = expectimax(np.copy(board_new), depth, move, type_hes)
-            # Update the maximum value and next move if a better move is found
-            if value > max_value:
+    if children is None:
+        children = legal_moves(board)
+    if depth == ADAPTIVE_DEPTH:
+        depth = choose_depth(board)
+    if stats is not None:
+        stats.start(depth)
+    # With one possible move or none there is nothing to search
+    if len(children) < 2:
+        next_move = fallback_move(board, type_hes, children)
+        if stats is not None:
+            stats.finish()
+        return next_move
+    if pool is not None:
+        # The values come back in move order, so the same move is chosen as in the serial search
+        values = parallel_root_values(board, depth, type_hes, pool, children)
+        for move, value in zip([move_left, move_up, move_down, move_right], values):
+            if value is not None and value > max_value:
                 max_value = value
-                next_move = move 
+                next_move = move
+        if max_value == -float('inf'):
+            next_move = fallback_move(board, type_hes, children)
+        if stats is not None:
+            stats.finish()
+        return next_move
+    # The pruning setting is read once, so the whole search uses the same one
+    pruning = search_pruning()
+    if table is None:
+        table = get_transposition_table(type_hes, pruning)
+    # Evaluate every possible move using the Expectimax algorithm
+    for move, (board_new, _) in children.items():
+        if stats is not None:
+            start = time.perf_counter()
+        value, _ = expectimax(np.copy(board_new), depth, move, type_hes, table, stats=stats, pruning=pruning)
+        if stats is not None:
+            stats.add_root_move(move.__name__, time.perf_counter() - start)
+        # Update the maximum value and next move if a better move is found
+        if value > max_value:
+            max_value = value
+            next_move = move 
     # If no valid move is found in the Expectimax algorithm, choose the move with the highest heuristic value
     if max_value == -float('inf'):
-        for move in [move_left, move_up, move_down, move_right]:
-            board_copy = np.copy(board)
-            board_new, move_made, _ = move(board_copy)
-            h = heuristic(board_new, type_hes)
-            # Update the maximum value and next move if a better move is found
-            if h > max_value:
-                max_value = h
-                next_move = move
+        next_move = fallback_move(board, type_hes, children)
+    if stats is not None:
+        stats.finish()
     # Return the best move determined by the Expectimax algorithm or the heuristic-based move
     return next_move
 
 
+# Limits of the timed search, each deeper iteration adds one move and one new tile to the search tree
+MAX_SEARCH_DEPTH = 8
+DEPTH_STEP = 2
+
+
+def find_move_timed(board, time_limit, type_hes, max_depth=MAX_SEARCH_DEPTH, table=None, stats=None, children=None):
+    '''
+    Find the best move with iterative deepening: search with depth 0, 2, 4, ... until the time is up,
+    and return the best move of the deepest search.
+    Every iteration searches the best move of the previous iteration first. When the time runs out after that move
+    has been searched, the best of the moves searched so far is kept: its deeper value is at least the deeper value
+    of the previous best move. Equal values are decided like in find_move, in the order left, up, down, right.
+    Parameters:
+    - board: 2D array representing the game board
+    - time_limit: Float, the time budget for the move in seconds
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - max_depth: Integer, the deepest search that is started even if there is time left
+    - table: TranspositionTable to cache values in, by default the shared table of the heuristic
+    - stats: Optional SearchStats, filled with the node counts and timings of all iterations together
+    - children: Optional result of legal_moves(board), computed here if not given
+    Returns:
+    - next_move: The best move function of the deepest search
+    '''
+    deadline = time.perf_counter() + time_limit
+    if stats is not None:
+        stats.start(0)
+    pruning = search_pruning()
+    if table is None:
+        table = get_transposition_table(type_hes, pruning)
+    # The boards after the possible moves are made only once for all iterations
+    if children is None:
+        children = legal_moves(board)
+    # The order of the children is left, up, down, right, the order find_move decides ties with
+    move_order = list(children)
+    ordered_moves = [(move, board_new) for move, (board_new, _) in children.items()]
+    next_move = None
+    # With one possible move or none there is nothing to search
+    if len(ordered_moves) < 2:
+        max_depth = -1
+    for depth in range(0, max_depth + 1, DEPTH_STEP):
+        values = {}
+        if stats is not None:
+            stats.root_depth = depth
+        try:
+            for move, board_new in ordered_moves:
+                if stats is not None:
+                    start = time.perf_counter()
+                value, _ = expectimax(np.copy(board_new), depth, move, type_hes, table, deadline, stats=stats, pruning=pruning)
+                if stats is not None:
+                    stats.add_root_move(move.__name__, time.perf_counter() - start)
+                values[move] = value
+        except SearchTimeout:
+            # A partial iteration is only used once it has searched the best move of the previous iteration
+            if values and depth > 0:
+                next_move = best_root_move(values, move_order) or next_move
+            break
+        # Without a finite value at this depth the move of the previous depth is kept
+        next_move = best_root_move(values, move_order) or next_move
+        # Sort the moves from best to worst, so the next iteration searches the best move first
+        ordered_moves.sort(key=lambda item: (-values[item[0]], move_order.index(item[0])))
+    # If no depth was completed or no move has a finite value, choose the move with the highest heuristic value
+    if next_move is None:
+        next_move = fallback_move(board, type_hes, children)
+    if stats is not None:
+        stats.finish()
+    return next_move
+
+
+def best_root_move(values, move_order):
+    '''
+    Choose the move with the highest value, the first one in move_order among equal values.
+    Parameters:
+    - values: Dictionary from move function to its expectimax value
+    - move_order: List of move functions deciding ties
+    Returns:
+    - next_move: The best move function, None if no move has a finite value
+    '''
+    next_move = min(values, key=lambda move: (-values[move], move_order.index(move)))
+    return next_move if values[next_move] > -math.inf else None
+
+
+# Persistent worker pool shared by all parallel searches, created the first time it is needed
+SEARCH_POOL = None
+# From this depth on the spawns after each root move are searched as separate tasks as well
+PARALLEL_CHANCE_DEPTH = 2
+
+
+def get_search_pool(processes=None):
+    '''
+    Return the shared worker pool for parallel searches, starting it the first time it is needed.
+    The workers keep their own transposition tables between searches.
+    Parameters:
+    - processes: Integer, number of worker processes, by default the number of cores
+    Returns:
+    - pool: multiprocessing Pool to pass to find_move
+    '''
+    global SEARCH_POOL
+    if SEARCH_POOL is None:
+        # Build the cached heuristic tables once here, not in every worker at the same time
+        feature_tables()
+        SEARCH_POOL = multiprocessing.Pool(processes)
+    return SEARCH_POOL
+
+
+def close_search_pool():
+    '''Stop the workers of the shared pool'''
+    global SEARCH_POOL
+    if SEARCH_POOL is not None:
+        SEARCH_POOL.close()
+        SEARCH_POOL.join()
+        SEARCH_POOL = None
+
+
+def search_subtree(task):
+    '''
+    Evaluate one subtree in a worker process.
+    Parameters:
+    - task: Tuple (board, depth, type_hes, probability, pruning) with the board of the subtree, its remaining depth,
+      the heuristic type, the probability of reaching the board and the pruning setting of the search.
+      The setting comes with the task since the workers do not see changes made to the module after they started
+    Returns:
+    - value: The expectimax value of the board
+    '''
+    board, depth, type_hes, probability, pruning = task
+    table = get_transposition_table(type_hes, pruning)
+    value, _ = expectimax(board, depth, None, type_hes, table, probability=probability, pruning=pruning)
+    return value
+
+
+def parallel_root_values(board, depth, type_hes, pool, children=None):
+    '''
+    Evaluate the four moves of a board with the subtrees spread over a process pool.
+    At PARALLEL_CHANCE_DEPTH and deeper each spawn after a root move is its own task, otherwise each root move is one task.
+    Parameters:
+    - board: 2D array representing the game board
+    - depth: Integer, the depth of the search tree for the Expectimax algorithm
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - pool: Process pool running search_subtree
+    - children: Optional result of legal_moves(board), computed here if not given
+    Returns:
+    - values: List with the value of each move (left, up, down, right), None for moves that are not possible
+    '''
+    pruning = search_pruning()
+    tasks = []
+    # For each move: None if it is not possible, else the index of its first task and the spawn probabilities
+    plans = []
+    if children is None:
+        children = legal_moves(board)
+    for move in [move_left, move_up, move_down, move_right]:
+        if move not in children:
+            plans.append(None)
+            continue
+        board_new, _ = children[move]
+        if depth >= PARALLEL_CHANCE_DEPTH and depth % 2 == 0 and np.any(board_new == 0):
+            # The same spawns as the chance node of the serial search
+            new_boards, probabilities = spawn_boards(board_new, pruning[1])
+            plans.append((len(tasks), probabilities))
+            tasks.extend((new_board, depth - 1, type_hes, probability, pruning) for new_board, probability in zip(new_boards, probabilities))
+        else:
+            plans.append((len(tasks), None))
+            tasks.append((board_new, depth, type_hes, 1.0, pruning))
+    # map keeps the order of the tasks, so the values are merged the same way whatever worker finishes first
+    results = pool.map(search_subtree, tasks)
+    values = []
+    for plan in plans:
+        if plan is None:
+            values.append(None)
+            continue
+        first_task, probabilities = plan
+        if probabilities is None:
+            values.append(results[first_task])
+        else:
+            # The spawns are weighted as in the serial search, which averages over the searched cells only
+            weights = probabilities / np.sum(probabilities)
+            values.append(float(np.dot(weights, results[first_task:first_task + len(probabilities)])))
+    return values
+
+
+def find_move_batched(board, depth, type_hes, children=None):
+    '''
+    Find the best move like find_move, but with the level-synchronous search of batch_search,
+    which expands every node of a layer at once as array operations.
+    Parameters:
+    - board: 2D array representing the game board
+    - depth: Integer, the depth of the search tree for the Expectimax algorithm, or ADAPTIVE_DEPTH to let depth_policy choose it
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - children: Optional result of legal_moves(board), computed here if not given
+    Returns:
+    - next_move: The best move function determined by the Expectimax algorithm
+    '''
+    if children is None:
+        children = legal_moves(board)
+    # With one possible move or none there is nothing to search
+    if len(children) < 2:
+        return fallback_move(board, type_hes, children)
+    if depth == ADAPTIVE_DEPTH:
+        depth = choose_depth(board)
+    values = batch_search.root_values(bitboard.encode_board(board), depth, get_heuristic(type_hes))
+    # If no valid move is found in the Expectimax algorithm, choose the move with the highest heuristic value
+    if np.max(values) == -float('inf'):
+        return fallback_move(board, type_hes, children)
+    # The first of the best moves is chosen, like the strict comparison in find_move
+    return [move_left, move_up, move_down, move_right][np.argmax(values)]
+
+
+def fallback_move(board, type_hes, children=None):
+    '''
+    Choose the possible move with the highest heuristic value, used when the search finds no move with a finite value.
+    Parameters:
+    - board: 2D array representing the game board
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - children: Optional result of legal_moves(board), computed here if not given
+    Returns:
+    - next_move: The move function leading to the board with the highest heuristic value,
+      move_left if no move changes the board
+    '''
+    if children is None:
+        children = legal_moves(board)
+    if not children:
+        return move_left
+    # A single possible move needs no scoring
+    if len(children) == 1:
+        return next(iter(children))
+    max_value = -float('inf')
+    next_move = None
+    for move, (board_new, _) in children.items():
+        h = heuristic(board_new, type_hes)
+        # Update the maximum value and next move if a better move is found
+        if h > max_value:
+            max_value = h
+            next_move = move
+    return next_move
 
 
-######################### GAME DISPLAY #############################################################
-
-
-class Display(Frame):
-    def __init__(self):
-        '''
-        Initialize the Display class, representing the graphical user interface for the 2048 game.
-        Attributes:
-        - grid_cells: List of Label widgets representing the cells of the game grid
-        - commands: Dictionary mapping key presses to corresponding move functions
-        '''
-        # Initialize the parent class (Frame)
-        Frame.__init__(self)
-        # Set up the grid layout and other components
-        self.grid()
-        self.build_buttons()
-        self.master.title('2048')
-        self.master.bind("<Key>", self.key_press)
-        # Define commands for key presses (mapping keys to move functions)
-        self.commands = {
-            UP_KEY: move_up,
-            DOWN_KEY: move_down,
-            LEFT_KEY: move_left,
-            RIGHT_KEY: move_right,
-        }
-        # Initialize the list to store grid cells
-        self.grid_cells = []
-        # Build the game grid and initialize the game matrix
-        self.build_grid()
-        self.init_matrix()
-        # Draw the initial state of the game grid
-        self.draw_grid_cells()
-        # Start the main event loop for the graphical interface
-        self.mainloop()
-
-    def build_grid(self):
-       '''
-        Build the game grid by creating Frame and Label widgets for each cell.
-        The cells are organized in rows and columns, and each cell has a corresponding Label widget.
-        Attributes:
-        - background: Frame widget serving as the background for the entire grid
-        - grid_cells: 2D list storing Label widgets representing the cells of the game grid
-        '''
-        # Create a background Frame for the entire grid with specified color and dimensions
-        background = Frame(self, bg=GAME_COLOR, width=EDGE_LENGTH, height=EDGE_LENGTH)
-        background.grid()
-        # Iterate through each row and column to create cells and corresponding Label widgets
-        for row in range(CELL_COUNT):
-            grid_row = []  # List to store Label widgets for a single row
-            for col in range(CELL_COUNT):
-                # Create a cell Frame with specified color and dimensions
-                cell = Frame(background, bg=EMPTY_COLOR, width=EDGE_LENGTH / CELL_COUNT, height=EDGE_LENGTH / CELL_COUNT)
-                cell.grid(row=row, column=col, padx=CELL_PAD, pady=CELL_PAD)
-                # Create a Label widget inside the cell with initial text and formatting
-                t = Label(master=cell, text="", bg=EMPTY_COLOR, justify=CENTER, font=LABEL_FONT, width=5, height=2)
-                t.grid()
-                # Append the Label widget to the row list
-                grid_row.append(t)
-            # Append the row list to the grid_cells 2D list
-            self.grid_cells.append(grid_row)
-
-    def init_matrix(self):
-        '''
-        Initialize the game matrix by calling the initialize_game function.
-        The resulting matrix is stored in the 'matrix' attribute of the Display class.
-        '''
-        self.matrix = initialize_game()
-
-    def draw_grid_cells(self):
-        '''
-        Update the graphical representation of the game grid based on the current state of the matrix.
-    
-        The method iterates through each cell in the matrix and configures the corresponding Label widget
-        in the graphical grid with the appropriate text, background color, and foreground color.
-        '''
-        for row in range(CELL_COUNT):
-            for col in range(CELL_COUNT):
-                tile_value = self.matrix[row][col]
-                if not tile_value:
-                    # Configure the Label widget for an empty cell
-                    self.grid_cells[row][col].configure(text="", bg=EMPTY_COLOR)
-                else:
-                    # Configure the Label widget for a non-empty cell with appropriate text and colors
-                    self.grid_cells[row][col].configure(
-                        text=str(tile_value), bg=TILE_COLORS[tile_value], fg=LABEL_COLORS[tile_value])
-    
-        # Update the graphical display to reflect the changes
-        self.update_idletasks()
-    
-    def build_buttons(self):
-        '''
-        Build the buttons for starting a new game and stopping the application.
-    
-        - new_game_button: Button widget for starting a new game, with text "New Game" and linked to the start_new_game method
-        - stop_button: Button widget for stopping the application, with text "Stop" and linked to the master.destroy method
-        '''
-        # Button for starting a new game
-        new_game_button = Button(self, text="New Game", command=self.start_new_game)
-        new_game_button.grid(row=CELL_COUNT, column=0, columnspan=2, pady=10)
-    
-        # Button for stopping the application
-        stop_button = Button(self, text="Stop", command=self.master.destroy)
-        stop_button.grid(row=CELL_COUNT, column=2, columnspan=2, pady=10)
-
-    def start_new_game(self):
-        '''
-        Start a new game by initializing the game matrix and updating the graphical representation of the grid.
-        '''
-        # Initialize the game matrix
-        self.init_matrix()
-    
-        # Update the graphical representation of the grid
-        self.draw_grid_cells()
-     
-    def key_press(self, event):
-        '''
-        Handle key press events.
-    
-        - key: Extracted key from the event.
-        - AI_PLAY_KEY: Key used to trigger automatic gameplay with a fixed depth and heuristic.
-        - AI_MULTI_PLAY: Key used to trigger multiple games with different depths and heuristics.
-    
-        For AI_PLAY_KEY:
-        - move_count: Counter for the number of moves.
-        - score_tot: Total score accumulated during gameplay.
-        - won_the_game: Flag indicating whether the game was won.
-        - Execute fixed_move until no valid moves left.
-        - Update statistics and display the results.
-    
-        For AI_MULTI_PLAY:
-        - num_games: Number of games to play.
-        - move_count, score_tot, won_the_game: Counters and flags for each game.
-        - results_weight: Matrix to store results for different depths and heuristics.
-        - Loop over specified depths, heuristics, and games, playing and recording results.
-        - Print the results for each depth.
-    
-        For general key commands:
-        - Execute the corresponding move command if the key is in the predefined commands.
-        - Update the game matrix, check for a valid move, add a new tile, and update the graphical representation.
-    
-        Note: Some commented code for handling win/loss popups is provided at the end but is currently disabled.
-        '''
-        key = repr(event.char)
-        
-        if key == AI_PLAY_KEY:
-            move_count = 0
-            score_tot = 0
-            won_the_game = 0
-            while fixed_move(self.matrix)[1]:
-                if not check_for_win(self.matrix):
-                    won_the_game = 1
-                move = find_move(self.matrix, depth=2, type_hes='WEIGHT_DIAG')
-                self.matrix, _, score_new = move(self.matrix) 
-                score_tot += score_new            
-                self.matrix = add_new_tile(self.matrix)
-                self.draw_grid_cells()
-                move_count += 1
-        elif key == AI_MULTI_PLAY:
-            num_games = 90
-            move_count = 0
-            score_tot = 0
-            won_the_game = 0
-            # Opret tomme matricer til at gemme resultaterne
-            results_weight = np.zeros((6, num_games))
-
-            # Loop for at spille spillet og gemme resultaterne
-            for DEPTH in [2]:
-                for j, types in enumerate(['WEIGHT_DIAG', 'WEIGHT_SNAKE']):
-                    for i in range(num_games):
-                        while fixed_move(self.matrix)[1]:
-                            if check_for_win(self.matrix):
-                                won_the_game = 1
-                            move = find_move(self.matrix, DEPTH, type_hes=types)
-                            self.matrix, _, score_new = move(self.matrix) 
-                            score_tot += score_new            
-                            self.matrix = add_new_tile(self.matrix)
-                            self.draw_grid_cells()
-                            move_count += 1
-                        results_weight[0 + 3*j, i] = move_count
-                        results_weight[1 + 3*j, i] = won_the_game
-                        results_weight[2 + 3*j, i] = score_tot
-                        move_count = 0
-                        score_tot = 0
-                        won_the_game = 0
-                        score_new = 0
-                        self.start_new_game()
-                print(f'Results for depth: {DEPTH}:')
-                print(f'{results_weight}\n')
-
-
-            """ for i in range(num_games):
-                while fixed_move(self.matrix)[1]:
-                    if check_for_win(self.matrix):
-                        won_the_game = 1
-                    move = find_move(self.matrix, depth=2, type_hes='WEIGHT_SNAKE')
-                    self.matrix, _, score_new = move(self.matrix) 
-                    score_tot += score_new            
-                    self.matrix = add_new_tile(self.matrix)
-                    self.draw_grid_cells()
-                    move_count += 1
-                results_weight_snake[0, i] = move_count
-                results_weight_snake[1, i] = won_the_game
-                results_weight_snake[2, i] = score_tot
-                move_count = 0
-                score_tot = 0
-                won_the_game = 0 
-                self.start_new_game() """
-
-
-            
-
-
-        if key in self.commands:
-            self.matrix, move_made, _ = self.commands[repr(event.char)](self.matrix)
-            if move_made:
-                self.matrix = add_new_tile(self.matrix)
-                self.draw_grid_cells()
-                move_made = False
-        
-        """if check_for_win(self.matrix):
-            popup = Toplevel(self.master)
-            popup.title("Game Over")
-            popup.geometry("300x150")
-            label = Label(popup, text=f'Congratulations! You\'ve reached {NUMBER_TO_WIN}. Game Over!')
-            label.pack(pady=10)
-            new_game_button = Button(popup, text="New Game", command=lambda: [self.start_new_game(), popup.destroy()])
-            new_game_button.pack(pady=10)
-            stop_button = Button(popup, text="Stop", command=self.master.destroy)
-            stop_button.pack(pady=10)
-        elif not fixed_move(self.matrix)[1]:
-            popup = Toplevel(self.master)
-            popup.title("Game Over")
-            popup.geometry("300x150")
-            label = Label(popup, text=f'Game Over! LOSSER!')
-            label.pack(pady=10)
-            new_game_button = Button(popup, text="New Game", command=lambda: [self.start_new_game(), popup.destroy()])
-            new_game_button.pack(pady=10)
-            stop_button = Button(popup, text="Stop", command=self.master.destroy)
-            stop_button.pack(pady=10) """
-
-
-
-
-gamegrid = Display()
+if __name__ == '__main__':
+    from game_2048_gui import Display
+    gamegrid = Display()
@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 NUMBER_OF_MOVES = 4
 SAMPLE_COUNT = 50
@@ -12,6 +11,7 @@ from game_functions import initialize_game, random_move,\
                             move_down, move_left,\
                             move_right, move_up,\
                             check_for_win, add_new_tile
+from rollouts import rollout_scores
 
                         
 
@@ -20,14 +20,14 @@ def get_search_params(move_number):
     search_length = SL_SCALE_PARAM * (1+(move_number // SEARCH_PARAM))
     return searches_per_move, search_length
 
-def ai_move(board, searches_per_move, search_length):
+def ai_move(board, searches_per_move, search_length, rng=None):
     possible_first_moves = [move_left, move_up, move_down, move_right]
     first_move_scores = np.zeros(NUMBER_OF_MOVES)
     for first_move_index in range(NUMBER_OF_MOVES):
         first_move_function =  possible_first_moves[first_move_index]
         board_with_first_move, first_move_made, first_move_score = first_move_function(board)
         if first_move_made:
-            board_with_first_move = add_new_tile(board_with_first_move)
+            board_with_first_move = add_new_tile(board_with_first_move, rng)
             first_move_scores[first_move_index] += first_move_score
         else:
             continue
@@ -36,9 +36,9 @@ def ai_move(board, searches_per_move, search_length):
             search_board = np.copy(board_with_first_move)
             game_valid = True
             while game_valid and move_number < search_length:
-                search_board, game_valid, score = random_move(search_board)
+                search_board, game_valid, score = random_move(search_board, rng)
                 if game_valid:
-                    search_board = add_new_tile(search_board)
+                    search_board = add_new_tile(search_board, rng)
                     first_move_scores[first_move_index] += score
                     move_number += 1
     best_move_index = np.argmax(first_move_scores)
@@ -46,15 +46,38 @@ def ai_move(board, searches_per_move, search_length):
     search_board, game_valid, score = best_move(board)
     return search_board, game_valid
 
-def ai_play(board):
+def ai_move_batched(board, searches_per_move, search_length, rng=None):
+    possible_first_moves = [move_left, move_up, move_down, move_right]
+    first_move_scores = np.zeros(NUMBER_OF_MOVES)
+    start_boards = []
+    made_indices = []
+    for first_move_index in range(NUMBER_OF_MOVES):
+        first_move_function = possible_first_moves[first_move_index]
+        board_with_first_move, first_move_made, first_move_score = first_move_function(board)
+        if not first_move_made:
+            continue
+        board_with_first_move = add_new_tile(board_with_first_move, rng)
+        first_move_scores[first_move_index] += first_move_score
+        start_boards.append(np.repeat(board_with_first_move[np.newaxis], searches_per_move, axis=0))
+        made_indices.append(first_move_index)
+    if made_indices and searches_per_move > 0:
+        # The playouts of all first moves advance together, one array step per move
+        playout_scores = rollout_scores(np.concatenate(start_boards), search_length, rng)
+        first_move_scores[made_indices] += playout_scores.reshape((len(made_indices), searches_per_move)).sum(axis=1)
+    best_move_index = np.argmax(first_move_scores)
+    best_move = possible_first_moves[best_move_index]
+    search_board, game_valid, score = best_move(board)
+    return search_board, game_valid
+
+def ai_play(board, rng=None):
     move_number = 0
     valid_game = True
     while valid_game:
         move_number += 1
         number_of_simulations, search_length = get_search_params(move_number)
-        board, valid_game = ai_move(board, number_of_simulations, search_length)
+        board, valid_game = ai_move_batched(board, number_of_simulations, search_length, rng)
         if valid_game:
-            board = add_two(board)
+            board = add_new_tile(board, rng)
         if check_for_win(board):
             valid_game = False
         print(board)
@@ -62,13 +85,18 @@ def ai_play(board):
     print(board)
     return np.amax(board)
 
-def ai_plot(move_func):
+def ai_plot(move_func, seed=None):
+    # Only the plot needs matplotlib, so importing the AI (for example in worker processes) does not load it
+    import matplotlib.pyplot as plt
     tick_locations = np.arange(1, 12)
     final_scores = []
+    # Every game gets its own independent random stream, spawned from the seed
+    game_seeds = np.random.SeedSequence(seed).spawn(SAMPLE_COUNT)
     for _ in range(SAMPLE_COUNT):
         print('thing is ', _)
-        board = initialize_game()
-        game_is_win = ai(board)
+        rng = np.random.default_rng(game_seeds[_])
+        board = initialize_game(rng)
+        game_is_win = ai_play(board, rng)
         final_scores.append(game_is_win)
     all_counts = np.zeros(11)
     unique, counts = np.unique(np.array(final_scores), return_counts=True)
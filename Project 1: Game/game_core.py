@@ -0,0 +1,124 @@
+import numpy as np
+
+from board_engine import MAX_EXPONENT, get_engine
+
+
+####################### INITIALIZATION ##################################
+'''The rules of the game, shared by every front end (game_2048_new2 and its window in game_2048_gui,
+game_2048_new, game_display, game_functions) and by the AIs, self_play and the benchmarks.
+Only NumPy is needed, so worker processes can import it without tkinter.
+
+A board is a 2D array of tile values of any size from board_engine.MIN_SIZE to board_engine.MAX_SIZE.
+Every move returns the new board as a new array, a flag telling if the move changed the board and the score
+of the merges. The moves are made on the packed board of board_engine: the tiles are pushed towards the edge,
+equal neighbours are merged starting from that edge and the tiles are pushed again.
+A cell of the packed board holds tiles up to MAX_TILE (32768): two MAX_TILE tiles are not merged,
+and a board holding a larger tile is refused with a ValueError.'''
+POSSIBLE_MOVES_COUNT = 4 #Up, down, left and right
+CELL_COUNT = 4 #Numbers of cells on the diagonal of a new game, unless another size is given
+NEW_TILE_DISTRIBUTION = np.array([2, 2, 2, 2, 2, 2, 2, 2, 2, 4])
+NUMBER_TO_WIN = 2048
+MAX_TILE = 1 << MAX_EXPONENT #Largest tile of the game, two of them do not merge
+
+# Random generator used when no generator is passed, pass a seeded np.random.Generator to make a game reproducible
+DEFAULT_RNG = np.random.default_rng()
+
+
+######################## GAME FUNCTION ###################################
+def initialize_game(rng=None, size=CELL_COUNT):
+    '''Return a new size x size board with a 2 tile in two random cells'''
+    rng = DEFAULT_RNG if rng is None else rng
+    board = np.zeros((size * size), dtype="int")
+    initial_twos = rng.choice(size * size, 2, replace=False)
+    board[initial_twos] = 2
+    board = board.reshape((size, size))
+    return board
+
+
+def move_up(board):
+    engine = get_engine(len(board))
+    return engine.apply_move(board, engine.move_up)
+
+
+def move_down(board):
+    engine = get_engine(len(board))
+    return engine.apply_move(board, engine.move_down)
+
+
+def move_left(board):
+    engine = get_engine(len(board))
+    return engine.apply_move(board, engine.move_left)
+
+
+def move_right(board):
+    engine = get_engine(len(board))
+    return engine.apply_move(board, engine.move_right)
+
+
+# In the order of board_engine and bitboard: left, up, down, right
+MOVES = [move_left, move_up, move_down, move_right]
+
+
+def fixed_move(board):
+    '''Make the first move of left, up, down, right that changes the board, the flag is False when the game is over'''
+    for func in MOVES:
+        new_board, move_made, _ = func(board)
+        if move_made:
+            return new_board, True
+    return board, False
+
+
+def legal_moves(board):
+    '''
+    Make every possible move on the board once, so the game-over check, the search and the fallback can share the new boards.
+    The moves that do not change the board are skipped without being made.
+    Parameters:
+    - board: 2D array representing the game board
+    Returns:
+    - children: Dictionary from each move function that changes the board to (new_board, score),
+      in the order left, up, down, right. It is empty when the game is over
+    '''
+    engine = get_engine(len(board))
+    children = {}
+    packed = engine.encode(board)
+    for move, packed_move, move_possible in zip(MOVES, engine.moves, engine.legal_directions(packed)):
+        if move_possible:
+            new_packed, score = packed_move(packed)
+            children[move] = (engine.decode(new_packed), score)
+    return children
+
+
+def can_move(board):
+    '''Check if the game goes on, that is if an empty cell or two equal neighbouring tiles are left'''
+    engine = get_engine(len(board))
+    return engine.can_move(engine.encode(board))
+
+
+def random_move(board, rng=None):
+    '''Make a random move that changes the board, the flag is False when no move is possible'''
+    rng = DEFAULT_RNG if rng is None else rng
+    move_made = False
+    move_order = [move_right, move_up, move_down, move_left]
+    # Try the moves in random order until one changes the board
+    while not move_made and len(move_order) > 0:
+        move_index = rng.integers(0, len(move_order))
+        move = move_order[move_index]
+        board, move_made, score = move(board)
+        if move_made:
+            return board, True, score
+        move_order.pop(move_index)
+    return board, False, score
+
+
+def add_new_tile(board, rng=None):
+    '''Place a 2 (or with probability 0.1 a 4) in a random empty cell of the board, the board is changed in place'''
+    rng = DEFAULT_RNG if rng is None else rng
+    tile_value = NEW_TILE_DISTRIBUTION[rng.integers(0, len(NEW_TILE_DISTRIBUTION))]
+    tile_row_options, tile_col_options = np.nonzero(np.logical_not(board))
+    tile_loc = rng.integers(0, len(tile_row_options))
+    board[tile_row_options[tile_loc], tile_col_options[tile_loc]] = tile_value
+    return board
+
+
+def check_for_win(board):
+    return NUMBER_TO_WIN in board
@@ -0,0 +1,305 @@
+import os
+import zipfile
+
+import numpy as np
+
+import bitboard
+
+
+####################### INITIALIZATION ##################################
+'''Registry of heuristics built from components. A component scores every possible row of the packed board
+(and every column, through the transposed board) once, in a table with one entry per encoded row.
+A heuristic is a linear combination of components: their tables are added up with the coefficients,
+so a board is scored with 4 row lookups (and 4 column lookups) however many components are combined.
+
+Components are registered with register_component and heuristics with register_heuristic,
+find_move and the other searches look heuristics up by name with get_heuristic.
+
+The tables of the components that do not depend on a weight matrix are built once and cached in FEATURE_TABLE_FILE,
+so later starts only load them. Change FEATURE_TABLE_VERSION when a component changes, to rebuild the cache.
+Nothing is loaded or built at import, only when the first heuristic that needs the tables scores a board.
+Code starting worker processes calls feature_tables first, so the cache is built once by the parent
+instead of by every worker at the same time.'''
+COMPONENTS = {}
+WEIGHTED_COMPONENTS = set() #Components whose tables depend on the weight matrix, they are not cached
+HEURISTICS = {}
+
+FEATURE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_tables.npz')
+FEATURE_TABLE_VERSION = 1
+
+#Exponent and probability of the new tiles
+SPAWN_TILES = [(1, 0.9), (2, 0.1)]
+
+# Exponents of the cells of every possible row, built the first time it is needed
+_ROW_CELLS = []
+# The cached component tables, loaded the first time they are needed
+_FEATURE_TABLES = []
+
+
+def row_cells():
+    '''Return the exponents of the cells of every encoded row, a 2D array (ROW_COUNT x 4), column 0 first'''
+    if not _ROW_CELLS:
+        rows = np.arange(bitboard.ROW_COUNT, dtype=np.int64)
+        _ROW_CELLS.append((rows[:, np.newaxis] >> (bitboard.CELL_BITS * np.arange(bitboard.CELL_COUNT))) & bitboard.CELL_MASK)
+    return _ROW_CELLS[0]
+
+
+def _compress(cells):
+    # Move the tiles of every line to the front, keeping their order, like a move does before merging
+    order = np.argsort(cells == 0, axis=1, kind='stable')
+    return np.take_along_axis(cells, order, axis=1)
+
+
+######################## COMPONENTS ###################################
+'''A component takes the cell exponents of every row (see row_cells) and the weight matrix of the heuristic,
+and returns the tables for the rows and for the columns. Each is a 2D array (4 x ROW_COUNT) with one table per
+row (or column) index, a 1D array (ROW_COUNT) used for all of them, or None if the component does not look at them.'''
+def register_component(name, uses_weight=False):
+    '''Decorator adding a component function to COMPONENTS under name'''
+    def register(component):
+        COMPONENTS[name] = component
+        if uses_weight:
+            WEIGHTED_COMPONENTS.add(name)
+        return component
+    return register
+
+
+def _every_line(line_values):
+    # One table for each of the 4 rows or columns
+    return line_values.astype(float)
+
+
+@register_component('positional', uses_weight=True)
+def positional(cells, weight):
+    '''The tile values multiplied with the weight matrix, the WEIGHT_SNAKE and WEIGHT_DIAG heuristics'''
+    values = np.where(cells > 0, 1 << cells, 0)
+    return (values @ weight.T.astype(np.int64)).T.astype(float), None
+
+
+@register_component('empty')
+def empty(cells, weight):
+    '''Number of empty cells'''
+    return _every_line(np.sum(cells == 0, axis=1)), None
+
+
+@register_component('merges')
+def merges(cells, weight):
+    '''Number of pairs of equal tiles that are next to each other once the empty cells are left out'''
+    tiles = _compress(cells)
+    pairs = np.sum((tiles[:, 1:] == tiles[:, :-1]) & (tiles[:, 1:] > 0), axis=1)
+    return _every_line(pairs), _every_line(pairs)
+
+
+@register_component('monotonicity')
+def monotonicity(cells, weight):
+    '''Minus the smallest total step, in exponents, against a rising or a falling order of the line'''
+    steps = np.diff(cells, axis=1)
+    against = np.minimum(np.sum(np.maximum(steps, 0), axis=1), np.sum(np.maximum(-steps, 0), axis=1))
+    return _every_line(-against), _every_line(-against)
+
+
+@register_component('smoothness')
+def smoothness(cells, weight):
+    '''Minus the differences, in exponents, between neighbouring tiles once the empty cells are left out'''
+    tiles = _compress(cells)
+    both_tiles = (tiles[:, 1:] > 0) & (tiles[:, :-1] > 0)
+    differences = np.sum(np.where(both_tiles, np.abs(np.diff(tiles, axis=1)), 0), axis=1)
+    return _every_line(-differences), _every_line(-differences)
+
+
+######################## CACHE ###################################
+def build_feature_tables():
+    '''Build the tables of every registered component that does not use the weight matrix'''
+    cells = row_cells()
+    return {name: COMPONENTS[name](cells, None) for name in COMPONENTS if name not in WEIGHTED_COMPONENTS}
+
+
+def load_feature_tables(path=FEATURE_TABLE_FILE):
+    '''
+    Load the component tables from the cache file, or build them and write the cache file
+    if it is missing, broken, of another version or lacks a component.
+
+    Parameters:
+    - path: String, location of the cache file
+
+    Returns:
+    - tables: Dictionary from component name to its (row tables, column tables)
+    '''
+    names = [name for name in COMPONENTS if name not in WEIGHTED_COMPONENTS]
+    try:
+        with np.load(path) as cached:
+            if int(cached['version']) == FEATURE_TABLE_VERSION:
+                tables = {}
+                for name in names:
+                    # An empty array stands for a component that does not look at the rows or the columns
+                    rows, columns = cached[name + '_rows'], cached[name + '_columns']
+                    tables[name] = (rows if rows.size else None, columns if columns.size else None)
+                if all(table is None or table.shape[-1] == bitboard.ROW_COUNT for pair in tables.values() for table in pair):
+                    return tables
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
+    tables = build_feature_tables()
+    arrays = {'version': np.array(FEATURE_TABLE_VERSION)}
+    for name, (rows, columns) in tables.items():
+        arrays[name + '_rows'] = rows if rows is not None else np.zeros(0)
+        arrays[name + '_columns'] = columns if columns is not None else np.zeros(0)
+    bitboard.write_table_cache(path, arrays)
+    return tables
+
+
+def feature_tables():
+    '''Return the cached component tables (see load_feature_tables), loading them the first time'''
+    if not _FEATURE_TABLES:
+        _FEATURE_TABLES.append(load_feature_tables())
+    return _FEATURE_TABLES[0]
+
+
+######################## HEURISTICS ###################################
+class Heuristic:
+    def __init__(self, coefficients, weight=None):
+        '''
+        A linear combination of components.
+
+        Parameters:
+        - coefficients: Dictionary from component name (see COMPONENTS) to its coefficient
+        - weight: 2D array (4x4), the weight matrix of the 'positional' component
+        '''
+        for name in coefficients:
+            if name not in COMPONENTS:
+                raise ValueError(f'Unknown heuristic component: {name}')
+        if 'positional' in coefficients and weight is None:
+            raise ValueError('The positional component needs a weight matrix')
+        self.coefficients = dict(coefficients)
+        self.weight = weight
+        # A weighted sum of the board is faster than packing it, so it is kept for the plain weight heuristics
+        self.positional_only = set(self.coefficients) == {'positional'}
+        self.row_tables = None
+        self.column_tables = None
+
+    def build_tables(self):
+        '''Add up the tables of the components, the first time the heuristic scores a packed board'''
+        if self.row_tables is not None:
+            return
+        row_tables = np.zeros((bitboard.CELL_COUNT, bitboard.ROW_COUNT))
+        column_tables = np.zeros((bitboard.CELL_COUNT, bitboard.ROW_COUNT))
+        uses_columns = False
+        for name, coefficient in self.coefficients.items():
+            if name not in WEIGHTED_COMPONENTS and name in feature_tables():
+                rows, columns = feature_tables()[name]
+            else:
+                rows, columns = COMPONENTS[name](row_cells(), self.weight)
+            if rows is not None:
+                row_tables += coefficient * rows
+            if columns is not None:
+                column_tables += coefficient * columns
+                uses_columns = True
+        self.row_tables = row_tables
+        self.column_tables = column_tables if uses_columns else None
+        # Plain lists are much faster than arrays to index with a single Python integer
+        self._row_lists = row_tables.tolist()
+        self._column_lists = column_tables.tolist() if uses_columns else None
+
+    def evaluate(self, packed):
+        '''
+        Score one packed board.
+
+        Parameters:
+        - packed: Integer, the packed board (see bitboard.encode_board)
+
+        Returns:
+        - h: Float, the heuristic value
+        '''
+        self.build_tables()
+        h = _lookup_rows(self._row_lists, packed)
+        if self._column_lists is not None:
+            h += _lookup_rows(self._column_lists, bitboard.transpose(packed))
+        return h
+
+    def evaluate_batch(self, packed):
+        '''
+        Score an array of packed boards.
+
+        Parameters:
+        - packed: 1D array of packed boards (dtype uint64)
+
+        Returns:
+        - h: 1D array with the heuristic value of every board
+        '''
+        self.build_tables()
+        h = _lookup_rows(self.row_tables, packed)
+        if self.column_tables is not None:
+            h = h + _lookup_rows(self.column_tables, bitboard.transpose(packed))
+        return h
+
+    def evaluate_spawns(self, packed):
+        '''
+        Score every board made by adding a new tile to a packed board and return the expected score,
+        without building the boards as arrays.
+
+        Parameters:
+        - packed: Integer, the packed board, with at least one empty cell
+
+        Returns:
+        - h: Float, the heuristic value averaged over the empty cells and the new tile values
+        '''
+        self.build_tables()
+        rows = self._row_lists
+        columns = self._column_lists
+        shifts = [shift for shift in range(0, 64, bitboard.CELL_BITS) if not (packed >> shift) & bitboard.CELL_MASK]
+        h = 0.0
+        for exponent, probability in SPAWN_TILES:
+            total = 0.0
+            for shift in shifts:
+                child = packed | (exponent << shift)
+                total += _lookup_rows(rows, child)
+                if columns is not None:
+                    total += _lookup_rows(columns, bitboard.transpose(child))
+            h += probability * total
+        return h / len(shifts)
+
+    def evaluate_board(self, board):
+        '''Score a game board (2D array)'''
+        if self.positional_only:
+            return self.coefficients['positional'] * np.sum(board * self.weight)
+        return self.evaluate(bitboard.encode_board(board))
+
+    def evaluate_boards(self, boards):
+        '''Score a stack of game boards (3D array N x 4 x 4), returns a 1D array'''
+        if self.positional_only:
+            # Contract the two board axes against the weight matrix
+            return self.coefficients['positional'] * np.tensordot(boards, self.weight, axes=2)
+        return self.evaluate_batch(bitboard.encode_batch(boards))
+
+    def symmetries(self):
+        '''
+        Return the board symmetries that do not change the heuristic value, as indices into bitboard.SYMMETRIES.
+        All components but the positional one score every row and column alike, in both directions.
+        '''
+        if 'positional' in self.coefficients:
+            return bitboard.invariant_symmetries(self.weight)
+        return tuple(range(len(bitboard.SYMMETRIES)))
+
+
+def _lookup_rows(tables, packed):
+    # Works on one packed board with lists of tables and on an array of packed boards with arrays of tables
+    h = tables[0][packed & bitboard.ROW_MASK]
+    h = h + tables[1][(packed >> 16) & bitboard.ROW_MASK]
+    h = h + tables[2][(packed >> 32) & bitboard.ROW_MASK]
+    return h + tables[3][packed >> 48]
+
+
+def register_heuristic(name, heuristic):
+    '''Make a Heuristic available under name, for example as the type_hes of find_move'''
+    HEURISTICS[name] = heuristic
+    return heuristic
+
+
+def get_heuristic(name):
+    '''Return the registered Heuristic called name'''
+    if name not in HEURISTICS:
+        raise ValueError(f'Unknown heuristic: {name}')
+    return HEURISTICS[name]
+
+
+# Empty cells, merges, monotonicity and smoothness, without positional weights
+register_heuristic('FEATURES', Heuristic({'empty': 270.0, 'merges': 700.0, 'monotonicity': 47.0, 'smoothness': 11.0}))
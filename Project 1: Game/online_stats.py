@@ -0,0 +1,116 @@
+import json
+import math
+import os
+
+
+####################### INITIALIZATION ##################################
+'''Online statistics of experiment runs: the results are added one game at a time and only running sums are kept,
+so a sweep of any length can be summarised while it runs without storing the games.'''
+
+
+######################## RUNNING STATISTICS ###################################
+class RunningStats:
+    def __init__(self):
+        '''
+        Mean, variance and maximum of a stream of numbers with Welford's algorithm.
+
+        Attributes:
+        - count: Number of values added
+        - mean: Mean of the values
+        - maximum: Largest value, None before the first value
+        '''
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 #Sum of squared differences from the mean
+        self.maximum = None
+
+    def add(self, value):
+        '''Add one value'''
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def variance(self):
+        '''Return the sample variance, 0 for less than two values'''
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def std(self):
+        '''Return the sample standard deviation'''
+        return math.sqrt(self.variance())
+
+
+class ConfigurationStats:
+    def __init__(self):
+        '''
+        Statistics of the games of one configuration (depth and heuristic).
+
+        Attributes:
+        - score, moves: RunningStats of the final score and the number of moves
+        - max_tiles: Dictionary counting the games per largest tile
+        - wins: Number of games that reached NUMBER_TO_WIN
+        - seconds: Total time spent playing
+        '''
+        self.score = RunningStats()
+        self.moves = RunningStats()
+        self.max_tiles = {}
+        self.wins = 0
+        self.seconds = 0.0
+
+    def add(self, result):
+        '''Add the result dictionary of one game (see self_play.play_game)'''
+        self.score.add(result['score'])
+        self.moves.add(result['moves'])
+        self.max_tiles[result['max_tile']] = self.max_tiles.get(result['max_tile'], 0) + 1
+        self.wins += int(result['won'])
+        self.seconds += result['seconds']
+
+    def summary(self):
+        '''Return the statistics as a dictionary that can be written as JSON'''
+        games = self.score.count
+        return {
+            'games': games,
+            'score_mean': self.score.mean,
+            'score_std': self.score.std(),
+            'score_max': self.score.maximum,
+            'moves_mean': self.moves.mean,
+            'moves_std': self.moves.std(),
+            'win_rate': self.wins / games if games else 0.0,
+            'max_tile_histogram': {str(tile): count for tile, count in sorted(self.max_tiles.items())},
+            'moves_per_second': self.moves.mean * games / self.seconds if self.seconds else 0.0,
+        }
+
+
+######################## AGGREGATOR ###################################
+class ResultAggregator:
+    def __init__(self, summary_path=None):
+        '''
+        Collect online statistics per configuration while the results of a run stream in.
+
+        Parameters:
+        - summary_path: Optional string, JSON file rewritten with the summary after every game
+        '''
+        self.summary_path = summary_path
+        self.configurations = {}
+
+    def add(self, result):
+        '''Add the result dictionary of one game and update the summary file'''
+        key = f"depth={result['depth']} heuristic={result['heuristic']}"
+        if key not in self.configurations:
+            self.configurations[key] = ConfigurationStats()
+        self.configurations[key].add(result)
+        if self.summary_path:
+            self.write_summary(self.summary_path)
+
+    def summary(self):
+        '''Return the statistics of every configuration, keyed by depth and heuristic'''
+        return {key: stats.summary() for key, stats in self.configurations.items()}
+
+    def write_summary(self, path):
+        '''Write the summary as JSON, replacing the file in one step so a reader never sees half a file'''
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+        os.replace(temporary_path, path)
@@ -0,0 +1,159 @@
+import numpy as np
+
+from game_core import MAX_TILE, NEW_TILE_DISTRIBUTION, DEFAULT_RNG
+
+
+####################### INITIALIZATION ##################################
+'''Monte-Carlo rollouts in lockstep: N independent games are stored as one (N, size, size) array and every
+step makes a random valid move and adds a new tile on all of them with a few array operations.
+The moves follow the rules of game_core (push, merge from the far edge, push again, two MAX_TILE tiles are not merged),
+for any board size.'''
+NUMBER_OF_MOVES = 4 #Left, up, down and right, the order of ai_move
+
+
+######################## BATCH MOVES ###################################
+def _push_rows_right(rows):
+    # Sorting on "is not empty" keeps the order of the tiles and puts the empty cells first
+    order = np.argsort(rows != 0, axis=1, kind='stable')
+    return np.take_along_axis(rows, order, axis=1)
+
+
+def slide_rows_right(rows):
+    '''
+    Move many rows to the right at once.
+
+    Parameters:
+    - rows: 2D array (M x size) of rows
+
+    Returns:
+    - new_rows: 2D array with the rows after the move
+    - score: 1D array with the merge score of every row
+    '''
+    new_rows = _push_rows_right(rows)
+    score = np.zeros(len(rows), dtype=new_rows.dtype)
+    # Merge from the right edge, one column at a time for all rows together
+    for col in range(rows.shape[1] - 1, 0, -1):
+        merge = (new_rows[:, col] == new_rows[:, col - 1]) & (new_rows[:, col] != 0) & (new_rows[:, col] < MAX_TILE)
+        new_rows[merge, col] *= 2
+        score += np.where(merge, new_rows[:, col], 0)
+        new_rows[merge, col - 1] = 0
+    return _push_rows_right(new_rows), score
+
+
+def _move_right(boards):
+    count, size, _ = boards.shape
+    new_rows, score = slide_rows_right(boards.reshape((count * size, size)))
+    return new_rows.reshape(boards.shape), score.reshape((count, size)).sum(axis=1)
+
+
+def move_boards(boards, move_index):
+    '''
+    Make the same move on a stack of boards.
+
+    Parameters:
+    - boards: 3D array (N x size x size) of game boards
+    - move_index: Integer, 0 for left, 1 for up, 2 for down and 3 for right
+
+    Returns:
+    - new_boards: 3D array with the boards after the move
+    - move_made: 1D boolean array, True where the move changed the board
+    - score: 1D array with the score obtained from merging on every board
+    '''
+    # Turn the boards so the move becomes a move to the right, and turn them back afterwards
+    if move_index == 0:
+        new_boards, score = _move_right(boards[:, :, ::-1])
+        new_boards = new_boards[:, :, ::-1]
+    elif move_index == 1:
+        new_boards, score = _move_right(boards.transpose((0, 2, 1))[:, :, ::-1])
+        new_boards = new_boards[:, :, ::-1].transpose((0, 2, 1))
+    elif move_index == 2:
+        new_boards, score = _move_right(boards.transpose((0, 2, 1)))
+        new_boards = new_boards.transpose((0, 2, 1))
+    else:
+        new_boards, score = _move_right(boards)
+    move_made = np.any(new_boards != boards, axis=(1, 2))
+    return np.ascontiguousarray(new_boards), move_made, score
+
+
+######################## RANDOM PLAY ###################################
+def random_move_batch(boards, rng=None):
+    '''
+    Make a random valid move on every board, like random_move does for one board.
+
+    Parameters:
+    - boards: 3D array (N x size x size) of game boards
+    - rng: Optional np.random.Generator drawing the moves
+
+    Returns:
+    - new_boards: 3D array with the boards after the move, unchanged where no move is possible
+    - move_made: 1D boolean array, False for the boards where no move is possible
+    - score: 1D array with the score obtained from merging on every board
+    '''
+    rng = DEFAULT_RNG if rng is None else rng
+    moved = [move_boards(boards, move_index) for move_index in range(NUMBER_OF_MOVES)]
+    valid = np.stack([move_made for _, move_made, _ in moved])
+    # A random key for every valid move, the largest key picks the move
+    keys = np.where(valid, rng.random(valid.shape), -1.0)
+    chosen = np.argmax(keys, axis=0)
+    board_index = np.arange(len(boards))
+    new_boards = np.stack([new for new, _, _ in moved])[chosen, board_index]
+    score = np.stack([score for _, _, score in moved])[chosen, board_index]
+    move_made = valid.any(axis=0)
+    new_boards[~move_made] = boards[~move_made]
+    return new_boards, move_made, np.where(move_made, score, 0)
+
+
+def add_new_tile_batch(boards, mask=None, rng=None):
+    '''
+    Add a new tile in a random empty cell of every board, like add_new_tile does for one board.
+
+    Parameters:
+    - boards: 3D array (N x size x size) of game boards, changed in place
+    - mask: Optional 1D boolean array, only the boards where it is True get a new tile
+    - rng: Optional np.random.Generator drawing the cells and tile values
+
+    Returns:
+    - boards: The same array with the new tiles
+    '''
+    rng = DEFAULT_RNG if rng is None else rng
+    count = len(boards)
+    flat = boards.reshape((count, -1))
+    empty = flat == 0
+    if mask is None:
+        mask = np.ones(count, dtype=bool)
+    mask = mask & empty.any(axis=1)
+    # A random key for every empty cell, the largest key picks the cell
+    keys = np.where(empty, rng.random(empty.shape), -1.0)
+    cells = np.argmax(keys, axis=1)
+    tile_values = NEW_TILE_DISTRIBUTION[rng.integers(0, len(NEW_TILE_DISTRIBUTION), count)]
+    board_index = np.nonzero(mask)[0]
+    flat[board_index, cells[board_index]] = tile_values[board_index]
+    return flat.reshape(boards.shape)
+
+
+def rollout_scores(boards, search_length, rng=None):
+    '''
+    Play random games from every board in lockstep and add up the scores they make.
+
+    Parameters:
+    - boards: 3D array (N x size x size) of start boards
+    - search_length: Integer, every game stops after search_length - 1 moves or when no move is possible
+    - rng: Optional np.random.Generator drawing the moves and new tiles
+
+    Returns:
+    - scores: 1D array with the total score of every game
+    '''
+    boards = np.array(boards)
+    scores = np.zeros(len(boards))
+    active = np.ones(len(boards), dtype=bool)
+    for _ in range(1, search_length):
+        if not active.any():
+            break
+        # Only the games that are still running are moved
+        index = np.nonzero(active)[0]
+        new_boards, move_made, score = random_move_batch(boards[index], rng)
+        boards[index] = new_boards
+        scores[index] += score
+        active[index] = move_made
+        add_new_tile_batch(boards, active, rng)
+    return scores
@@ -0,0 +1,87 @@
+import time
+
+
+####################### INITIALIZATION ##################################
+'''Opt-in counters of the expectimax search. Pass a SearchStats to find_move or find_move_timed and it is filled
+with the work of that call; without one the search only pays for an "is None" check per node.'''
+#Kinds of nodes
+MAX_NODE = 'max'
+CHANCE_NODE = 'chance'
+LEAF = 'leaf' #A board scored with the heuristic
+
+
+######################## SEARCH STATISTICS ###################################
+class SearchStats:
+    def __init__(self, callback=None):
+        '''
+        Collect the node counts and timings of one search.
+
+        Parameters:
+        - callback: Optional function called with the SearchStats when a search is finished, for example to log every move
+
+        Attributes:
+        - nodes: Dictionary with the number of MAX_NODE, CHANCE_NODE and LEAF nodes visited
+        - cache_hits: Number of nodes whose value was found in the transposition table
+        - cache_misses: Number of nodes that were looked up in the transposition table and searched
+        - max_depth: The deepest level below the root moves that was reached, leaves included
+        - root_move_seconds: Dictionary with the time spent on the subtree of each root move, keyed by move name
+        - seconds: Total time of the search
+        '''
+        self.callback = callback
+        self.start(0)
+
+    def start(self, root_depth):
+        '''Reset the counters before a search of depth root_depth'''
+        self.root_depth = root_depth
+        self.nodes = {MAX_NODE: 0, CHANCE_NODE: 0, LEAF: 0}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.max_depth = 0
+        self.root_move_seconds = {}
+        self.seconds = 0.0
+        self.start_time = time.perf_counter()
+
+    def visit(self, kind, depth, count=1):
+        '''
+        Count nodes of one kind.
+
+        Parameters:
+        - kind: String, MAX_NODE, CHANCE_NODE or LEAF
+        - depth: Integer, the remaining depth of the nodes (as in expectimax)
+        - count: Integer, the number of nodes
+        '''
+        self.nodes[kind] += count
+        level = self.root_depth - depth
+        if level > self.max_depth:
+            self.max_depth = level
+
+    def add_root_move(self, move_name, seconds):
+        '''Add the time spent on the subtree of a root move'''
+        self.root_move_seconds[move_name] = self.root_move_seconds.get(move_name, 0.0) + seconds
+
+    def finish(self):
+        '''Stop the clock of the search and call the callback'''
+        self.seconds = time.perf_counter() - self.start_time
+        if self.callback is not None:
+            self.callback(self)
+
+    def total_nodes(self):
+        '''Return the number of nodes of all kinds'''
+        return sum(self.nodes.values())
+
+    def nodes_per_second(self):
+        return self.total_nodes() / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        '''Return the counters as a dictionary that can be written as JSON'''
+        return {
+            'max_nodes': self.nodes[MAX_NODE],
+            'chance_nodes': self.nodes[CHANCE_NODE],
+            'leaves': self.nodes[LEAF],
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'max_depth': self.max_depth,
+            'root_move_seconds': dict(self.root_move_seconds),
+            'seconds': self.seconds,
+            'nodes_per_second': self.nodes_per_second(),
+        }
@@ -0,0 +1,197 @@
+import argparse
+import csv
+import functools
+import sys
+import time
+
+import numpy as np
+
+import bitboard
+from depth_policy import ADAPTIVE_DEPTH
+from online_stats import ResultAggregator
+from game_core import initialize_game, legal_moves, add_new_tile, check_for_win, move_left, move_up, move_down, move_right
+from game_2048_new2 import MAX_SEARCH_DEPTH, find_move, find_move_batched, find_move_timed
+from traces import TraceRecorder, TraceWriter
+
+
+####################### INITIALIZATION ##################################
+'''Headless self-play: plays seeded games with the AI of game_2048_new2 without opening the Tk window,
+and writes one line per game. Run it as a script, for example
+
+    python self_play.py --games 90 --depths 2 adaptive --heuristics WEIGHT_DIAG WEIGHT_SNAKE --output results.csv
+
+With --engine timed every move is searched with iterative deepening within --time-limit seconds,
+the depth is then the deepest search that is started.
+
+With --trace every move is also appended to a binary trace file (see traces.py), and the result line of a game
+gets the number of the game in that file. With --summary the mean, standard deviation and maximum of the scores,
+the win rate, the histogram of the largest tiles and the moves per second of every configuration are kept up to date
+in a JSON file while the games are played.
+
+Game i of a run draws its tiles from its own random stream, spawned from the base seed with np.random.SeedSequence.
+Every configuration plays the same streams, so the configurations are compared on the same sequences of new tiles.'''
+NUM_GAMES = 90
+DEPTHS = [2]
+HEURISTICS = ['WEIGHT_DIAG', 'WEIGHT_SNAKE']
+BASE_SEED = 0
+
+TIME_LIMIT = 0.1 #Seconds per move of the timed engine
+
+
+def find_move_time_limited(board, depth, type_hes, children=None, time_limit=TIME_LIMIT):
+    '''find_move_timed called like find_move: depth is the deepest search, MAX_SEARCH_DEPTH for ADAPTIVE_DEPTH'''
+    max_depth = MAX_SEARCH_DEPTH if depth == ADAPTIVE_DEPTH else depth
+    return find_move_timed(board, time_limit, type_hes, max_depth, children=children)
+
+
+ENGINES = {
+    'recursive': find_move,
+    'batched': find_move_batched,
+    'timed': find_move_time_limited,
+}
+TIMED_ENGINES = {'timed'} #Engines taking the time limit
+
+RESULT_FIELDS = ['depth', 'heuristic', 'game', 'seed', 'moves', 'score', 'max_tile', 'won', 'seconds']
+TRACE_FIELD = 'trace_game'
+
+MOVE_ORDER = [move_left, move_up, move_down, move_right] #Index of a move in a trace record
+
+
+######################## SELF PLAY ###################################
+def game_seed(base_seed, game):
+    '''
+    Return the seed of one game: the child number game of np.random.SeedSequence(base_seed).spawn(...),
+    so the games get independent streams, whatever process plays them.
+    '''
+    return np.random.SeedSequence(base_seed, spawn_key=(game,))
+
+
+def play_game(depth, type_hes, seed, engine='recursive', recorder=None, time_limit=TIME_LIMIT):
+    '''
+    Play one game with the AI until no move is possible.
+
+    Parameters:
+    - depth: Integer or ADAPTIVE_DEPTH, the search depth passed to the engine
+    - type_hes: String, name of a registered heuristic (see heuristics.py), such as 'WEIGHT_SNAKE' or 'WEIGHT_DIAG'
+    - seed: Integer or np.random.SeedSequence, seed of the random tiles (see game_seed)
+    - engine: String, key of ENGINES choosing the search function
+    - recorder: Optional TraceRecorder receiving every move
+    - time_limit: Float, seconds per move for the engines of TIMED_ENGINES
+
+    Returns:
+    - result: Dictionary with the number of moves, the total score, the largest tile, the win flag and the time used
+    '''
+    search = ENGINES[engine]
+    if engine in TIMED_ENGINES:
+        search = functools.partial(search, time_limit=time_limit)
+    rng = np.random.default_rng(seed)
+    board = initialize_game(rng)
+    move_count = 0
+    score_tot = 0
+    won_the_game = 0
+    start = time.perf_counter()
+    # Same loop as the AI_MULTI_PLAY key of the game, without drawing the board
+    children = legal_moves(board)
+    while children:
+        if check_for_win(board):
+            won_the_game = 1
+        move = search(board, depth, type_hes, children=children)
+        board_before = board
+        board, score_new = children[move]
+        score_tot += score_new
+        if recorder is not None:
+            # Find the new tile by comparing the board before and after adding it
+            moved_board = np.copy(board)
+            board = add_new_tile(board, rng)
+            spawn_cells = np.flatnonzero(board != moved_board)
+            spawn_cell = int(spawn_cells[0]) if len(spawn_cells) else 0
+            spawn_tile = int(board.flat[spawn_cell]).bit_length() - 1 if len(spawn_cells) else 0
+            recorder.record(bitboard.encode_board(board_before), MOVE_ORDER.index(move), spawn_cell, spawn_tile, int(score_new))
+        else:
+            board = add_new_tile(board, rng)
+        move_count += 1
+        children = legal_moves(board)
+    return {
+        'moves': move_count,
+        'score': int(score_tot),
+        'max_tile': int(np.max(board)),
+        'won': int(won_the_game or check_for_win(board)),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def run_experiment(output, num_games=NUM_GAMES, depths=DEPTHS, heuristics=HEURISTICS, base_seed=BASE_SEED, engine='recursive',
+                   trace_path=None, summary_path=None, time_limit=TIME_LIMIT):
+    '''
+    Play num_games games for every combination of depth and heuristic and write the results as CSV.
+
+    Parameters:
+    - output: Writable text file receiving one CSV line per game
+    - num_games: Integer, number of games per configuration
+    - depths: List of depths (integers or ADAPTIVE_DEPTH)
+    - heuristics: List of heuristic types
+    - base_seed: Integer, game i is played with game_seed(base_seed, i)
+    - engine: String, key of ENGINES choosing the search function
+    - trace_path: Optional string, trace file every move is appended to
+    - summary_path: Optional string, JSON file with the statistics of the run, rewritten after every game
+    - time_limit: Float, seconds per move for the engines of TIMED_ENGINES
+
+    Returns:
+    - summary: Dictionary with the statistics of every configuration (see online_stats.ResultAggregator)
+    '''
+    writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS + ([TRACE_FIELD] if trace_path else []))
+    writer.writeheader()
+    trace_writer = TraceWriter(trace_path) if trace_path else None
+    aggregator = ResultAggregator(summary_path)
+    for depth in depths:
+        for type_hes in heuristics:
+            for game in range(num_games):
+                result = {'depth': depth, 'heuristic': type_hes, 'game': game, 'seed': base_seed}
+                recorder = TraceRecorder() if trace_writer else None
+                result.update(play_game(depth, type_hes, game_seed(base_seed, game), engine, recorder, time_limit))
+                if trace_writer:
+                    result[TRACE_FIELD] = trace_writer.write_game(recorder.records())
+                writer.writerow(result)
+                # Write every game as soon as it is finished, so a long run can be followed
+                output.flush()
+                aggregator.add(result)
+    if trace_writer:
+        trace_writer.close()
+    return aggregator.summary()
+
+
+def parse_depth(value):
+    '''Read a depth argument, either an integer or the word used for ADAPTIVE_DEPTH'''
+    if value == ADAPTIVE_DEPTH:
+        return ADAPTIVE_DEPTH
+    return int(value)
+
+
+def build_parser(description='Play 2048 games with the expectimax AI without the GUI.'):
+    '''Build the command line options shared by the self-play scripts'''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--games', type=int, default=NUM_GAMES, help='number of games per configuration')
+    parser.add_argument('--depths', type=parse_depth, nargs='+', default=DEPTHS, help=f'search depths, integers or {ADAPTIVE_DEPTH}')
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS, help='heuristic types')
+    parser.add_argument('--seed', type=int, default=BASE_SEED, help='base seed the random streams of the games are spawned from')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='recursive', help='search function')
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help='seconds per move of the timed engine')
+    parser.add_argument('--output', default=None, help='CSV file for the results, standard output if not given')
+    parser.add_argument('--trace', default=None, help='binary trace file every move is appended to')
+    parser.add_argument('--summary', default=None, help='JSON file with running statistics per configuration')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.output is None:
+        run_experiment(sys.stdout, args.games, args.depths, args.heuristics, args.seed, args.engine, args.trace, args.summary,
+                       args.time_limit)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            run_experiment(output, args.games, args.depths, args.heuristics, args.seed, args.engine, args.trace, args.summary,
+                           args.time_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+
+import bitboard
+import game_core
+import rollouts
+from board_engine import MIN_SIZE, MAX_SIZE, get_engine
+
+
+####################### INITIALIZATION ##################################
+'''Checks of the packed moves against the plain Python rules they replaced. Run them with
+
+    python -m pytest test_board.py
+'''
+SEED = 2048
+BOARD_COUNT = 200
+
+
+def random_boards(size, count=BOARD_COUNT, seed=SEED):
+    '''Boards with random tiles up to 2**15, about a third of the cells empty and many equal neighbours'''
+    rng = np.random.default_rng(seed)
+    exponents = rng.integers(0, 8, (count, size, size))
+    # Some boards with large tiles, to check the 2**15 cap
+    exponents[::4] += rng.integers(0, 9, (len(exponents[::4]), 1, 1))
+    exponents = np.minimum(exponents, bitboard.MAX_EXPONENT)
+    exponents[rng.random((count, size, size)) < 0.3] = 0
+    return np.where(exponents > 0, 1 << exponents, 0)
+
+
+def random_full_boards(size, count=100, seed=SEED):
+    '''Boards without an empty cell, half of them with neighbouring 2**15 tiles'''
+    rng = np.random.default_rng(seed)
+    exponents = rng.integers(1, 16, (count, size, size))
+    exponents[::2, 0, :2] = bitboard.MAX_EXPONENT
+    return 1 << exponents
+
+
+######################## REFERENCE ###################################
+def reference_row_right(row):
+    '''The row after a move to the right and the merge score, as the game did before the packed board'''
+    tiles = [tile for tile in row if tile != 0]
+    merged = []
+    score = 0
+    while tiles:
+        tile = tiles.pop()
+        if tiles and tiles[-1] == tile and tile < game_core.MAX_TILE:
+            tiles.pop()
+            tile *= 2
+            score += tile
+        merged.append(tile)
+    return [0] * (len(row) - len(merged)) + merged[::-1], score
+
+
+def reference_move(board, move_index):
+    '''Make the move of index move_index (left, up, down, right) with the plain Python rules'''
+    # Turn the board so the move is a move to the right, and turn it back afterwards
+    turn, unturn = [
+        (lambda b: b[:, ::-1], lambda b: b[:, ::-1]),
+        (lambda b: b.T[:, ::-1], lambda b: b[:, ::-1].T),
+        (lambda b: b.T, lambda b: b.T),
+        (lambda b: b, lambda b: b),
+    ][move_index]
+    rows = []
+    score = 0
+    for row in turn(board).tolist():
+        new_row, row_score = reference_row_right(row)
+        rows.append(new_row)
+        score += row_score
+    new_board = unturn(np.array(rows))
+    return new_board, not np.array_equal(new_board, board), score
+
+
+######################## MOVES ###################################
+def test_bitboard_moves_match_reference():
+    moves = [bitboard.move_left, bitboard.move_up, bitboard.move_down, bitboard.move_right]
+    for board in random_boards(4):
+        packed = bitboard.encode_board(board)
+        for move_index, move in enumerate(moves):
+            new_board, move_made, score = reference_move(board, move_index)
+            new_packed, packed_score = move(packed)
+            assert np.array_equal(bitboard.decode_board(new_packed), new_board)
+            assert (new_packed != packed) == move_made
+            assert packed_score == score
+
+
+def test_batch_moves_match_single_moves():
+    boards = random_boards(4)
+    packed = bitboard.encode_batch(boards)
+    assert packed.tolist() == [bitboard.encode_board(board) for board in boards]
+    moves = [bitboard.move_left, bitboard.move_up, bitboard.move_down, bitboard.move_right]
+    for move, batch_move in zip(moves, bitboard.BATCH_MOVES):
+        new_boards, scores = batch_move(packed)
+        assert [(int(new_board), int(score)) for new_board, score in zip(new_boards, scores)] == \
+               [move(int(board)) for board in packed]
+
+
+@pytest.mark.parametrize('size', range(MIN_SIZE, MAX_SIZE + 1))
+def test_engine_moves_match_reference(size):
+    for board in random_boards(size, count=50):
+        for move_index, move in enumerate(game_core.MOVES):
+            new_board, move_made, score = move(board)
+            reference_board, reference_made, reference_score = reference_move(board, move_index)
+            assert np.array_equal(new_board, reference_board)
+            assert move_made == reference_made
+            assert score == reference_score
+
+
+@pytest.mark.parametrize('size', range(MIN_SIZE, MAX_SIZE + 1))
+def test_rollout_moves_match_reference(size):
+    boards = random_boards(size, count=50)
+    for move_index in range(game_core.POSSIBLE_MOVES_COUNT):
+        new_boards, move_made, score = rollouts.move_boards(boards, move_index)
+        for board, new_board, made, board_score in zip(boards, new_boards, move_made, score):
+            reference_board, reference_made, reference_score = reference_move(board, move_index)
+            assert np.array_equal(new_board, reference_board)
+            assert made == reference_made
+            assert board_score == reference_score
+
+
+@pytest.mark.parametrize('size', range(MIN_SIZE, MAX_SIZE + 1))
+def test_encode_refuses_tiles_above_cap(size):
+    board = np.zeros((size, size), dtype=int)
+    board[0, 0] = 2 * game_core.MAX_TILE
+    with pytest.raises(ValueError):
+        get_engine(size).encode(board)
+
+
+######################## LEGALITY ###################################
+@pytest.mark.parametrize('size', range(MIN_SIZE, MAX_SIZE + 1))
+def test_legality_matches_trial_moves(size):
+    engine = get_engine(size)
+    # Full boards as well, where the game over check matters
+    boards = list(random_boards(size, count=100)) + list(random_full_boards(size))
+    for board in boards:
+        packed = engine.encode(board)
+        trials = [reference_move(board, move_index)[1] for move_index in range(game_core.POSSIBLE_MOVES_COUNT)]
+        assert list(engine.legal_directions(packed)) == trials
+        assert engine.can_move(packed) == any(trials)
+        assert game_core.can_move(board) == any(trials)
+        assert len(game_core.legal_moves(board)) == sum(trials)
+
+
+######################## SYMMETRIES ###################################
+def test_symmetries_match_array_symmetries():
+    for board in random_boards(4, count=50):
+        packed = bitboard.encode_board(board)
+        for symmetry, array_symmetry in zip(bitboard.SYMMETRIES, bitboard.ARRAY_SYMMETRIES):
+            assert symmetry(packed) == bitboard.encode_board(array_symmetry(board))
+
+
+def test_symmetry_moves_map_moves_to_their_images():
+    moves = [bitboard.move_left, bitboard.move_up, bitboard.move_down, bitboard.move_right]
+    for board in random_boards(4, count=50):
+        packed = bitboard.encode_board(board)
+        for symmetry, images in zip(bitboard.SYMMETRIES, bitboard.SYMMETRY_MOVES):
+            for move_index, move in enumerate(moves):
+                new_packed, score = move(packed)
+                assert moves[images[move_index]](symmetry(packed)) == (symmetry(new_packed), score)
@@ -0,0 +1,48 @@
+import numpy as np
+
+import game_2048_new2
+from game_core import legal_moves
+
+
+####################### INITIALIZATION ##################################
+'''Checks that the expectimax values do not depend on what was searched before. Run them with
+
+    python -m pytest test_search.py
+'''
+BOARD = np.array([[32, 8, 4, 2],
+                  [8, 4, 2, 0],
+                  [2, 0, 0, 2],
+                  [4, 0, 0, 0]])
+TYPE_HES = 'WEIGHT_SNAKE'
+
+
+def serial_root_values(board, depth, pruning):
+    '''The value of every possible move, each searched without a transposition table'''
+    return [game_2048_new2.expectimax(np.copy(board_new), depth, move, TYPE_HES, pruning=pruning)[0]
+            for move, (board_new, _) in legal_moves(board).items()]
+
+
+######################## TRANSPOSITION TABLE ###################################
+def test_cutoff_value_does_not_depend_on_earlier_searches():
+    pruning = (0.01, None)
+    fresh, _ = game_2048_new2.expectimax(np.copy(BOARD), 2, None, TYPE_HES, pruning=pruning)
+    table = game_2048_new2.get_transposition_table(TYPE_HES, pruning)
+    # Fill the table from a visit that is unlikely enough to be cut off below the root
+    game_2048_new2.expectimax(np.copy(BOARD), 2, None, TYPE_HES, table, probability=0.02, pruning=pruning)
+    later, _ = game_2048_new2.expectimax(np.copy(BOARD), 2, None, TYPE_HES, table, pruning=pruning)
+    assert later == fresh
+
+
+######################## PARALLEL SEARCH ###################################
+def test_pool_values_match_serial_values(monkeypatch):
+    pool = game_2048_new2.get_search_pool(2)
+    try:
+        # The settings are changed after the workers started
+        monkeypatch.setattr(game_2048_new2, 'PROBABILITY_CUTOFF', 0.01)
+        monkeypatch.setattr(game_2048_new2, 'MAX_SPAWN_CELLS', 2)
+        pruning = game_2048_new2.search_pruning()
+        for depth in (2, 4):
+            values = game_2048_new2.parallel_root_values(BOARD, depth, TYPE_HES, pool)
+            assert np.allclose(values, serial_root_values(BOARD, depth, pruning), rtol=1e-12)
+    finally:
+        game_2048_new2.close_search_pool()
@@ -0,0 +1,32 @@
+import os
+
+import tournament
+
+
+####################### INITIALIZATION ##################################
+'''Checks of the retries of the tournament scheduler. Run them with
+
+    python -m pytest test_tournament.py
+'''
+GAME_COUNT = 12
+CRASHING_GAME = 0
+
+
+def crashing_play_job(job, trace=False):
+    '''Play a job without a game, the worker of CRASHING_GAME dies'''
+    depth, type_hes, game, base_seed, engine, time_limit = job
+    if game == CRASHING_GAME:
+        os._exit(1)
+    return {'depth': depth, 'heuristic': type_hes, 'game': game, 'seed': base_seed}
+
+
+######################## RETRIES ###################################
+def test_only_the_crashing_game_fails(monkeypatch):
+    # The workers are forked, so they play the replaced job function
+    monkeypatch.setattr(tournament, 'play_job', crashing_play_job)
+    jobs = tournament.make_jobs(GAME_COUNT, [2], ['WEIGHT_SNAKE'], 0, 'recursive')
+    results = list(tournament.stream_games(jobs, processes=2))
+    failed = [result['job'] for result in results if 'error' in result]
+    played = sorted(result['game'] for result in results if 'error' not in result)
+    assert failed == [jobs[CRASHING_GAME]]
+    assert played == [game for game in range(GAME_COUNT) if game != CRASHING_GAME]
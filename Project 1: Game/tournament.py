@@ -0,0 +1,209 @@
+import csv
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from heuristics import feature_tables
+from online_stats import ResultAggregator
+from self_play import RESULT_FIELDS, TIME_LIMIT, TRACE_FIELD, build_parser, game_seed, play_game
+from traces import TraceRecorder, TraceWriter
+
+
+####################### INITIALIZATION ##################################
+'''Multi-process tournament: the games of a sweep over depths and heuristics are spread over a pool of
+worker processes, and every result is written as soon as its game is finished. Run it as a script, for example
+
+    python tournament.py --games 300 --depths 2 adaptive --heuristics WEIGHT_DIAG WEIGHT_SNAKE --processes 8 --output sweep.csv
+
+Games use the same seeds as self_play.py, so a tournament gives the same games as the serial runner.
+If a worker process dies, the pool is restarted and the unfinished games are played again. The games that were running
+are played again one at a time to find the one that kills its worker, only failures of that game count.
+A game that fails more than MAX_RETRIES times is reported on standard error and skipped.
+With --trace the workers record the moves and the main process appends them to the trace file.'''
+MAX_RETRIES = 2
+
+# Queue of the started jobs in a worker process, set when the worker starts
+STARTED_JOBS = None
+
+
+######################## SCHEDULING ###################################
+def make_jobs(num_games, depths, heuristics, base_seed, engine, time_limit=TIME_LIMIT):
+    '''
+    List one job per game of the sweep.
+
+    Returns:
+    - jobs: List of tuples (depth, type_hes, game, base_seed, engine, time_limit)
+    '''
+    return [(depth, type_hes, game, base_seed, engine, time_limit)
+            for depth in depths for type_hes in heuristics for game in range(num_games)]
+
+
+def play_job(job, trace=False):
+    '''
+    Play the game of a job in a worker process.
+
+    Parameters:
+    - job: Tuple (depth, type_hes, game, base_seed, engine, time_limit), see make_jobs
+    - trace: Flag, if True the moves are recorded and returned under 'trace'
+
+    Returns:
+    - result: Dictionary with the RESULT_FIELDS of the game
+    '''
+    depth, type_hes, game, base_seed, engine, time_limit = job
+    recorder = TraceRecorder() if trace else None
+    # The stream of a game only depends on the base seed and the game number, not on the worker playing it
+    result = {'depth': depth, 'heuristic': type_hes, 'game': game, 'seed': base_seed}
+    result.update(play_game(depth, type_hes, game_seed(base_seed, game), engine, recorder, time_limit))
+    if trace:
+        result['trace'] = recorder.records()
+    return result
+
+
+def _start_worker(started):
+    # The queue the workers put every job on when they start it, see run_job
+    global STARTED_JOBS
+    STARTED_JOBS = started
+
+
+def run_job(job, trace=False):
+    '''Mark a job as started and play it, in a worker process of stream_games (see play_job)'''
+    STARTED_JOBS.put(job)
+    return play_job(job, trace)
+
+
+def stream_games(jobs, processes=None, max_retries=MAX_RETRIES, trace=False):
+    '''
+    Play the jobs on a process pool and yield the results in the order the games finish.
+    When a worker dies, the games that had not started yet are played again without counting an attempt.
+    The games that were running are played again one at a time on their own worker, so only the game
+    that kills its worker counts a failed attempt.
+
+    Parameters:
+    - jobs: List of jobs, see make_jobs
+    - processes: Integer, number of worker processes, by default the number of cores
+    - max_retries: Integer, how many times a game is played again after it failed
+    - trace: Flag, if True every result has the records of its moves under 'trace'
+
+    Returns:
+    - results: Generator of dictionaries. A game that keeps failing gives a dictionary with its job
+      under 'job' and the last error under 'error' instead of a result
+    '''
+    attempts = {job: 0 for job in jobs}
+    pending = list(jobs)
+    # Games that were running when a worker died, each is played alone
+    suspects = []
+    while pending or suspects:
+        if pending:
+            batch, pending = pending, []
+            batch_processes = processes
+        else:
+            batch, suspects = suspects[:1], suspects[1:]
+            batch_processes = 1
+        started = multiprocessing.SimpleQueue()
+        executor = ProcessPoolExecutor(batch_processes, initializer=_start_worker, initargs=(started,))
+        futures = {executor.submit(run_job, job, trace): job for job in batch}
+        finished = set()
+        try:
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as error:
+                    # The game raised an error, the worker itself is still fine
+                    finished.add(job)
+                    attempts[job] += 1
+                    if attempts[job] > max_retries:
+                        yield {'job': job, 'error': repr(error)}
+                    else:
+                        pending.append(job)
+                    continue
+                finished.add(job)
+                yield result
+        except BrokenProcessPool as error:
+            # A worker died, which breaks the whole pool, so every unfinished game is played again on a new pool
+            running = set()
+            while not started.empty():
+                running.add(started.get())
+            running -= finished
+            if not running:
+                # The worker died before it could mark a game, so none of them can be ruled out
+                running = set(futures.values()) - finished
+            for job in futures.values():
+                if job in finished:
+                    continue
+                if job not in running:
+                    pending.append(job)
+                elif len(running) > 1:
+                    # Any of the running games may have killed the worker
+                    suspects.append(job)
+                else:
+                    attempts[job] += 1
+                    if attempts[job] > max_retries:
+                        yield {'job': job, 'error': repr(error)}
+                    else:
+                        suspects.append(job)
+        finally:
+            # Also stops the workers when the caller stops reading results early
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_tournament(output, num_games, depths, heuristics, base_seed, engine, processes=None, max_retries=MAX_RETRIES,
+                   trace_path=None, summary_path=None, time_limit=TIME_LIMIT):
+    '''
+    Play the sweep on a process pool and write one CSV line per game as soon as it is finished.
+
+    Parameters:
+    - output: Writable text file receiving the CSV lines
+    - num_games, depths, heuristics, base_seed, engine: The sweep, see self_play.run_experiment
+    - processes: Integer, number of worker processes, by default the number of cores
+    - max_retries: Integer, how many times a game is played again after it failed
+    - trace_path: Optional string, trace file every move is appended to
+    - summary_path: Optional string, JSON file with the statistics of the run, rewritten after every game
+    - time_limit: Float, seconds per move for the timed engine
+
+    Returns:
+    - failed: List of the jobs that could not be played
+    '''
+    # Build the cached heuristic tables once here, not in every worker at the same time
+    feature_tables()
+    aggregator = ResultAggregator(summary_path)
+    writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS + ([TRACE_FIELD] if trace_path else []))
+    writer.writeheader()
+    trace_writer = TraceWriter(trace_path) if trace_path else None
+    failed = []
+    jobs = make_jobs(num_games, depths, heuristics, base_seed, engine, time_limit)
+    for result in stream_games(jobs, processes, max_retries, trace_writer is not None):
+        if 'error' in result:
+            print(f"Game {result['job']} failed: {result['error']}", file=sys.stderr)
+            failed.append(result['job'])
+            continue
+        if trace_writer:
+            result[TRACE_FIELD] = trace_writer.write_game(result.pop('trace'))
+        writer.writerow(result)
+        output.flush()
+        aggregator.add(result)
+    if trace_writer:
+        trace_writer.close()
+    return failed
+
+
+def main(argv=None):
+    parser = build_parser('Play a sweep of 2048 AI games on a pool of worker processes.')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes, by default the number of cores')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES, help='how many times a failed game is played again')
+    args = parser.parse_args(argv)
+    if args.output is None:
+        failed = run_tournament(sys.stdout, args.games, args.depths, args.heuristics, args.seed, args.engine, args.processes,
+                                args.retries, args.trace, args.summary, args.time_limit)
+    else:
+        with open(args.output, 'w', newline='') as output:
+            failed = run_tournament(output, args.games, args.depths, args.heuristics, args.seed, args.engine, args.processes,
+                                    args.retries, args.trace, args.summary, args.time_limit)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
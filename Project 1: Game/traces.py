@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+
+####################### INITIALIZATION ##################################
+'''Binary game traces: every move of a game is one fixed-width record, appended to a trace file.
+The file starts with a 16 byte header (magic bytes and the record size) followed by the records,
+so read_trace can memory-map all records of a file as one NumPy structured array without copying.
+
+A record holds the packed board before the move (see bitboard.encode_board), the move (0 left, 1 up, 2 down, 3 right),
+the cell (4 * row + col) and log2 value of the new tile added after the move, and the score of the move.
+spawn_tile is 0 when no tile was added.'''
+TRACE_DTYPE = np.dtype([
+    ('game', '<u4'), #Number of the game in the trace file
+    ('move', '<u4'), #Number of the move in the game
+    ('board', '<u8'),
+    ('action', 'u1'),
+    ('spawn_cell', 'u1'),
+    ('spawn_tile', 'u1'),
+    ('score', '<u4'),
+])
+
+TRACE_MAGIC = b'2048TRC1'
+HEADER_SIZE = 16
+HEADER = TRACE_MAGIC + np.uint64(TRACE_DTYPE.itemsize).astype('<u8').tobytes()
+
+
+######################## RECORDING ###################################
+class TraceRecorder:
+    def __init__(self):
+        '''
+        Collect the moves of one game in memory, to be written with TraceWriter.write_game.
+        A recorder is cheap to send between processes, so workers can record and the main process can write.
+        '''
+        self.moves = []
+
+    def record(self, board, action, spawn_cell, spawn_tile, score):
+        '''
+        Store one move.
+
+        Parameters:
+        - board: Integer, the packed board before the move
+        - action: Integer, index of the move (0 left, 1 up, 2 down, 3 right)
+        - spawn_cell: Integer, the cell (4 * row + col) of the new tile
+        - spawn_tile: Integer, log2 of the new tile, 0 if no tile was added
+        - score: Integer, the score obtained from merging
+        '''
+        self.moves.append((0, len(self.moves), board, action, spawn_cell, spawn_tile, score))
+
+    def records(self):
+        '''Return the moves as an array of TRACE_DTYPE records'''
+        return np.array(self.moves, dtype=TRACE_DTYPE)
+
+
+class TraceWriter:
+    def __init__(self, path):
+        '''
+        Open a trace file for appending, writing the header if the file is new.
+
+        Parameters:
+        - path: String, location of the trace file
+
+        Attributes:
+        - games: Number of games in the file, the next game written gets this number
+        '''
+        self.path = path
+        self.games = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            existing = read_trace(path)
+            if len(existing):
+                self.games = int(existing['game'].max()) + 1
+            # Drop a record cut off by a crash, so the new records stay aligned
+            os.truncate(path, HEADER_SIZE + len(existing) * TRACE_DTYPE.itemsize)
+            del existing
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER)
+
+    def write_game(self, records):
+        '''
+        Append the records of one game and give them the next game number.
+
+        Parameters:
+        - records: Array of TRACE_DTYPE records, for example TraceRecorder.records()
+
+        Returns:
+        - game: Integer, the number of the game in the trace file
+        '''
+        game = self.games
+        records = np.array(records, dtype=TRACE_DTYPE)
+        records['game'] = game
+        self.file.write(records.tobytes())
+        self.file.flush()
+        self.games += 1
+        return game
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+######################## REPLAY ###################################
+def read_trace(path):
+    '''
+    Memory-map the records of a trace file.
+
+    Parameters:
+    - path: String, location of the trace file
+
+    Returns:
+    - records: Read-only array of TRACE_DTYPE records backed by the file.
+      A record cut off at the end of the file (for example by a crash while writing) is left out
+    '''
+    with open(path, 'rb') as trace_file:
+        header = trace_file.read(HEADER_SIZE)
+    if header != HEADER:
+        raise ValueError(f'{path} is not a trace file of this format')
+    record_count = (os.path.getsize(path) - HEADER_SIZE) // TRACE_DTYPE.itemsize
+    if record_count == 0:
+        return np.zeros(0, dtype=TRACE_DTYPE)
+    return np.memmap(path, dtype=TRACE_DTYPE, mode='r', offset=HEADER_SIZE, shape=(record_count,))
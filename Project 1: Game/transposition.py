@@ -0,0 +1,142 @@
+from collections import OrderedDict
+
+from bitboard import IDENTITY, canonical_form
+
+
+####################### INITIALIZATION ##################################
+#Eviction policies
+LRU = 'lru' #Evict the entry that was used the longest time ago
+DEPTH_PREFERRED = 'depth' #Evict the least recently used entry with the smallest remaining depth
+
+'''Rough size of one entry (key tuple, two integers, value tuple and the dictionary slot) in bytes,
+used to turn a memory cap into a number of entries'''
+ENTRY_BYTES = 300
+
+
+######################## TRANSPOSITION TABLE ###################################
+class TranspositionTable:
+    def __init__(self, max_entries=200000, policy=LRU, max_bytes=None, symmetries=(IDENTITY,)):
+        '''
+        Initialize a bounded cache of search results, keyed by the packed board and the remaining depth.
+        A table stores values of one heuristic only, so every heuristic needs its own table.
+
+        Parameters:
+        - max_entries: Integer, the maximum number of stored positions
+        - policy: String, either LRU or DEPTH_PREFERRED, specifying which entry is evicted when the table is full
+        - max_bytes: Integer, optional memory cap that overrides max_entries using ENTRY_BYTES per entry
+        - symmetries: Tuple of indices into bitboard.SYMMETRIES under which the stored values do not change,
+          positions that are images of each other then share one entry (see canonical)
+
+        Attributes:
+        - hits: Number of lookups that found a stored value
+        - misses: Number of lookups that did not find a stored value
+        - evictions: Number of entries removed to make room for new ones
+        '''
+        if policy not in (LRU, DEPTH_PREFERRED):
+            raise ValueError(f'Unknown eviction policy: {policy}')
+        if max_bytes is not None:
+            max_entries = max_bytes // ENTRY_BYTES
+        self.max_entries = max_entries
+        self.policy = policy
+        self.symmetries = tuple(symmetries)
+        # LRU keeps one ordered dictionary, the depth preferred policy keeps one per remaining depth
+        self.entries = OrderedDict()
+        self.depths = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    def canonical(self, bitboard):
+        '''
+        Return the key to store a position under, the same for all its images under the symmetries of the table.
+
+        Parameters:
+        - bitboard: Integer, the packed board (see bitboard.encode_board)
+
+        Returns:
+        - key: Integer, the packed board to pass to get and put
+        - symmetry: Integer, index of the symmetry that maps the board to key, to map stored moves back
+        '''
+        if len(self.symmetries) == 1:
+            return bitboard, IDENTITY
+        return canonical_form(bitboard, self.symmetries)
+
+    def get(self, bitboard, depth):
+        '''
+        Look up a stored value and mark it as recently used.
+
+        Parameters:
+        - bitboard: Integer, the packed board (see bitboard.encode_board)
+        - depth: Integer, the remaining search depth
+
+        Returns:
+        - value: The stored value, or None if the position is not in the table
+        '''
+        if self.policy == LRU:
+            entries = self.entries
+            key = (bitboard, depth)
+        else:
+            entries = self.depths.get(depth)
+            key = bitboard
+        value = entries.get(key) if entries is not None else None
+        if value is None:
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, bitboard, depth, value):
+        '''
+        Store a value, evicting an entry first if the table is full.
+
+        Parameters:
+        - bitboard: Integer, the packed board (see bitboard.encode_board)
+        - depth: Integer, the remaining search depth
+        - value: The value to store, must not be None
+        '''
+        if self.max_entries <= 0:
+            return
+        if self.policy == LRU:
+            entries = self.entries
+            key = (bitboard, depth)
+        else:
+            entries = self.depths.setdefault(depth, OrderedDict())
+            key = bitboard
+        if key in entries:
+            entries[key] = value
+            entries.move_to_end(key)
+            return
+        if self.size >= self.max_entries:
+            self.evict()
+        entries[key] = value
+        self.size += 1
+
+    def evict(self):
+        '''Remove one entry according to the eviction policy'''
+        if self.policy == LRU:
+            self.entries.popitem(last=False)
+        else:
+            # Shallow results are the cheapest to compute again
+            depth = min(depth for depth, bucket in self.depths.items() if bucket)
+            self.depths[depth].popitem(last=False)
+        self.size -= 1
+        self.evictions += 1
+
+    def clear(self):
+        '''Remove all entries and reset the counters'''
+        self.entries.clear()
+        self.depths.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self):
+        '''Return the fraction of lookups that found a stored value'''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0